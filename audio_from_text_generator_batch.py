@@ -0,0 +1,394 @@
+"""
+Пакетная конвертация множества текстовых файлов в аудио
+Все документы обрабатываются одним процессом: чанки всех документов идут
+через общий пул потоков, общий пул HTTP-запросов и общий ограничитель
+частоты (настройки - как у audio_from_text_generator_chunks_gtts.py).
+Документы с большим приоритетом обрабатываются первыми. Итоговый файл
+документа собирается в отдельном пуле, как только готовы все его чанки,
+параллельно с синтезом следующих документов.
+
+Вход (BATCH_INPUT):
+    директория - все файлы *.txt, выход BATCH_OUTPUT_DIR/<имя>.<расширение OUTPUT_FILE>
+    JSON-файл - список {"input": ..., "output": ..., "priority": 0}
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime
+import functools
+import heapq
+import json
+import os
+import shutil
+import sys
+import threading
+
+import audio_from_text_generator_chunks_gtts as pipeline
+from audio_from_text_generator_chunks_gtts import CONFIG as PIPELINE_CONFIG, log
+
+CONFIG = {
+    "input": os.getenv("BATCH_INPUT", "input"),
+    "output_dir": os.getenv("BATCH_OUTPUT_DIR", "output"),
+    # Одновременных сборок итоговых файлов (FFmpeg)
+    "finalize_workers": max(1, int(os.getenv("FINALIZE_WORKERS", 2))),
+}
+
+
+class BatchDocument:
+    """
+    Документ пакета и состояние его обработки
+    Текст читается и разбивается при первом обращении к чанкам,
+    поэтому в памяти находятся только документы, которые уже в работе.
+    text - готовый текст вместо чтения файла input_path (задания демона).
+    """
+
+    def __init__(
+        self, order: int, input_path: str, output: str, priority: int = 0, text: str = None
+    ):
+        self.order = order
+        self.input = input_path
+        self.output = output
+        self.priority = priority
+        self.temp_dir = os.path.join(
+            PIPELINE_CONFIG["temp_dir"], f"{order:04d}_{os.path.basename(input_path)}"
+        )
+        self.chunks = self._iter_chunks(text)
+        self.results = []  # Пути к частям по номеру чанка (None - неудача)
+        self.done = 0  # Завершенных чанков
+        self.failed = 0  # Из них неудачных
+        self.planned = False  # Все чанки поставлены в очередь
+        self.future = None  # Future сборки итогового файла
+
+    def _iter_chunks(self, text: str = None):
+        if text is None:
+            with open(self.input, "r", encoding="utf-8") as f:
+                text = f.read()
+        text = text.strip()
+        os.makedirs(self.temp_dir, exist_ok=True)
+        chunks = pipeline.split_text(text, PIPELINE_CONFIG["chunk_size"])
+        del text
+        log(f"{self.input}: {len(chunks)} частей", "INFO")
+        yield from chunks
+
+    @property
+    def complete(self) -> bool:
+        return self.planned and self.done == len(self.results)
+
+    def state(self) -> dict:
+        """Состояние обработки: queued, synthesizing, finalizing, done или failed"""
+        state = {
+            "status": "queued",
+            "output": self.output,
+            "chunks_done": self.done,
+            "chunks_failed": self.failed,
+            "chunks_total": len(self.results) if self.planned else None,
+        }
+        if self.future is not None and self.future.done():
+            error = self.future.exception()
+            state["status"] = "failed" if error else "done"
+            if error:
+                state["error"] = f"{type(error).__name__} - {str(error)}"
+        elif self.future is not None:
+            state["status"] = "finalizing"
+        elif self.results:
+            state["status"] = "synthesizing"
+        return state
+
+
+def load_documents(source: str) -> list:
+    """Список документов пакета из директории или JSON-манифеста"""
+    ext = os.path.splitext(PIPELINE_CONFIG["output"])[1] or ".ogg"
+    if os.path.isdir(source):
+        entries = [
+            {"input": os.path.join(source, name)}
+            for name in sorted(os.listdir(source))
+            if name.endswith(".txt")
+        ]
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+
+    documents = []
+    for order, entry in enumerate(entries):
+        stem = os.path.splitext(os.path.basename(entry["input"]))[0]
+        output = entry.get("output") or os.path.join(CONFIG["output_dir"], stem + ext)
+        documents.append(
+            BatchDocument(order, entry["input"], output, int(entry.get("priority", 0)))
+        )
+    return documents
+
+
+def finalize_document(doc: BatchDocument) -> int:
+    """Сборка итогового файла документа, возвращает число вошедших чанков"""
+    parts = [path for path in doc.results if path]
+    try:
+        if not parts:
+            raise RuntimeError("Не удалось сгенерировать ни одного аудиофрагмента")
+        os.makedirs(os.path.dirname(os.path.abspath(doc.output)), exist_ok=True)
+        pipeline.finalize_parts(parts, doc.output, doc.temp_dir)
+    finally:
+        # Части неудачного документа тоже удаляются: демон не копит их
+        shutil.rmtree(doc.temp_dir, ignore_errors=True)
+    return len(parts)
+
+
+class BatchRunner:
+    """
+    Обработка потока документов общими ресурсами
+    Движок, ограничитель частоты, кэш, повтор фрагментов и пулы потоков
+    создаются один раз и живут, пока runner не закрыт; документы можно
+    добавлять во время работы (submit). Очередь - куча по (-приоритет,
+    порядок): следующий чанк всегда берется у самого приоритетного
+    незавершенного документа, в работе не более 2*WORKERS чанков.
+    Когда все чанки документа готовы, его сборка ставится в пул сборки,
+    результат - doc.future. on_update(doc) вызывается при каждом изменении
+    состояния документа.
+    """
+
+    def __init__(self, on_update=None):
+        self.engine = pipeline.create_engine()
+        self.limiter = pipeline.create_limiter(self.engine)
+        self.cache = None
+        if PIPELINE_CONFIG["cache_dir"]:
+            self.cache = pipeline.ChunkCache(
+                PIPELINE_CONFIG["cache_dir"], PIPELINE_CONFIG["cache_max_size_mb"] * 2**20
+            )
+        self.dedup = None
+        if PIPELINE_CONFIG["dedup"]:
+            # Общий для всех документов: повторы между документами тоже в счет
+            self.dedup = pipeline.SegmentDedup(
+                self.engine, PIPELINE_CONFIG["dedup_max_size_mb"] * 2**20
+            )
+        self.on_update = on_update
+
+        self.finalize_pool = ThreadPoolExecutor(
+            max_workers=CONFIG["finalize_workers"], thread_name_prefix="finalize"
+        )
+        self.request_pool = ThreadPoolExecutor(
+            max_workers=PIPELINE_CONFIG["request_workers"] or PIPELINE_CONFIG["workers"],
+            thread_name_prefix="tts_request",
+        )
+        self.pool = ThreadPoolExecutor(max_workers=PIPELINE_CONFIG["workers"])
+
+        self.queue = []
+        self.pending = 0  # Чанков в работе
+        self.max_pending = PIPELINE_CONFIG["workers"] * 2
+        self.closed = False
+        self.error = None  # Ошибка, остановившая поток подачи
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._dispatch, name="dispatch", daemon=True)
+        self.thread.start()
+
+    def submit(self, doc: BatchDocument):
+        """Постановка документа в очередь"""
+        with self.cond:
+            if self.error is None:
+                heapq.heappush(self.queue, (-doc.priority, doc.order, doc))
+                self.cond.notify_all()
+                return
+            self._fail(doc, self.error)
+        self._notify(doc)
+
+    def _fail(self, doc: BatchDocument, error: BaseException):
+        """Завершение документа ошибкой error (под блокировкой)"""
+        doc.future = Future()
+        doc.future.set_exception(error)
+        self.cond.notify_all()
+
+    def _dispatch(self):
+        """
+        Поток подачи чанков (_dispatch_chunks)
+        Непредвиденная ошибка завершает ошибкой документы очереди - иначе
+        join и close ждали бы их вечно - и пробрасывается дальше
+        """
+        try:
+            self._dispatch_chunks()
+        except BaseException as e:
+            with self.cond:
+                self.error = e
+                failed = [doc for _, _, doc in self.queue if doc.future is None]
+                self.queue = []
+                for doc in failed:
+                    self._fail(doc, e)
+            log(f"Ошибка подачи чанков: {type(e).__name__} - {str(e)}", "ERROR")
+            for doc in failed:
+                self._notify(doc)
+            raise
+
+    def _dispatch_chunks(self):
+        """
+        Подача чанков в пул синтеза (отдельный поток)
+        Очередной чанк берется вне блокировки: первое обращение читает и
+        разбивает весь документ, а _chunk_done рабочих потоков ждать этого
+        не должны. Место в пуле резервируется заранее. on_update тоже
+        вызывается вне блокировки: обработчик может брать свои.
+        """
+        while True:
+            with self.cond:
+                while not self.closed and not (self.queue and self.pending < self.max_pending):
+                    self.cond.wait()
+                if self.closed:
+                    return
+                doc = self.queue[0][2]
+                self.pending += 1  # Резерв места под чанк
+
+            chunk = error = None
+            try:
+                chunk = next(doc.chunks)
+            except StopIteration:
+                pass
+            except (OSError, ValueError) as e:  # Нет файла, не UTF-8
+                error = e
+
+            with self.cond:
+                if chunk is None:
+                    self.pending -= 1
+                    # Пока документ разбивался, в очередь мог встать более
+                    # приоритетный: удаляем именно этот
+                    self.queue = [entry for entry in self.queue if entry[2] is not doc]
+                    heapq.heapify(self.queue)
+                    if error is None:
+                        doc.planned = True
+                        self._finish(doc)
+                    else:
+                        log(f"Пропуск {doc.input}: {str(error)}", "ERROR")
+                        self._fail(doc, error)
+                    self.cond.notify_all()
+                else:
+                    idx = len(doc.results)
+                    doc.results.append(None)
+            if chunk is None:
+                self._notify(doc)
+                continue
+            future = self.pool.submit(
+                pipeline.process_chunk,
+                self.engine,
+                idx,
+                chunk,
+                None,
+                self.limiter,
+                self.cache,
+                self.request_pool,
+                False,
+                doc.temp_dir,
+                self.dedup,
+            )
+            future.add_done_callback(functools.partial(self._chunk_done, doc, idx))
+            self._notify(doc)
+
+    def _chunk_done(self, doc: BatchDocument, idx: int, future):
+        """Завершение чанка (вызывается в рабочем потоке)"""
+        try:
+            result = future.result()
+        except BaseException as e:  # Отмена при закрытии, непредвиденная ошибка
+            result = None
+            if not self.closed:
+                log(f"Ошибка чанка {idx + 1} документа {doc.input}: {str(e)}", "ERROR")
+        with self.cond:
+            self.pending -= 1
+            doc.results[idx] = result
+            doc.done += 1
+            if not result:
+                doc.failed += 1
+                log(f"Пропуск чанка {idx + 1} документа {doc.input}", "WARN")
+            self._finish(doc)
+            self.cond.notify_all()
+        self._notify(doc)
+
+    def _finish(self, doc: BatchDocument):
+        """Сборка документа, если все его чанки завершены (под блокировкой)"""
+        if doc.complete and doc.future is None and not self.closed:
+            log(f"Все чанки {doc.input} готовы, сборка {doc.output}", "INFO")
+            doc.future = self.finalize_pool.submit(finalize_document, doc)
+            doc.future.add_done_callback(lambda _: self._notify(doc))
+            self.cond.notify_all()
+
+    def _notify(self, doc: BatchDocument):
+        if self.on_update:
+            self.on_update(doc)
+
+    def join(self, documents: list):
+        """Ожидание завершения обработки и сборки documents"""
+        with self.cond:
+            while not all(doc.future for doc in documents):
+                self.cond.wait(1.0)  # С таймаутом: Ctrl-C в главном потоке
+        wait([doc.future for doc in documents])
+
+    def close(self, cancel: bool = False):
+        """Остановка: cancel=True - без ожидания незавершенных задач"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        for pool in (self.pool, self.request_pool, self.finalize_pool):
+            pool.shutdown(wait=True, cancel_futures=cancel)
+        if self.dedup:
+            pipeline.log_dedup_stats()
+        if isinstance(self.limiter, pipeline.AdaptiveRateLimiter):
+            log(f"Автоподстройка: {self.limiter.summary()}", "INFO")
+            try:
+                self.limiter.save()
+            except OSError as e:
+                log(f"Не удалось сохранить частоту запросов: {str(e)}", "WARN")
+
+
+def run_batch(documents: list):
+    """Обработка документов одним BatchRunner, результаты - в doc.future"""
+    runner = BatchRunner()
+    cancel = True
+    try:
+        for doc in documents:
+            runner.submit(doc)
+        runner.join(documents)
+        cancel = False
+    finally:
+        runner.close(cancel)
+
+
+def main():
+    """Пакетная конвертация документов"""
+    start_time = datetime.now()
+    log("=" * 60)
+    log(f"🚀 ПАКЕТНАЯ КОНВЕРТАЦИЯ: {os.path.abspath(CONFIG['input'])}")
+    log("=" * 60)
+
+    try:
+        documents = load_documents(CONFIG["input"])
+        if not PIPELINE_CONFIG["overwrite"]:
+            skipped = [doc for doc in documents if os.path.exists(doc.output)]
+            for doc in skipped:
+                log(f"Пропуск {doc.input}: {doc.output} уже существует", "INFO")
+            documents = [doc for doc in documents if doc not in skipped]
+        if not documents:
+            raise ValueError("Нет документов для обработки")
+        log(f"Документов в пакете: {len(documents)}", "INFO")
+
+        run_batch(documents)
+    except Exception as e:
+        log(f"💥 КРИТИЧЕСКАЯ ОШИБКА: {type(e).__name__} - {str(e)}", "ERROR")
+        sys.exit(1)
+
+    failed = 0
+    for doc in documents:
+        try:
+            ok = doc.future.result()
+            log(f"✅ {doc.output}: {ok}/{len(doc.results)} чанков", "INFO")
+        except Exception as e:
+            failed += 1
+            log(f"❌ {doc.input}: {type(e).__name__} - {str(e)}", "ERROR")
+
+    pipeline.write_metrics(
+        success=int(not failed),
+        documents=len(documents),
+        documents_ok=len(documents) - failed,
+        duration_seconds=(datetime.now() - start_time).total_seconds(),
+    )
+    log("=" * 60)
+    log(f"Готово: {len(documents) - failed}/{len(documents)} документов")
+    log(f"Общее время: {datetime.now() - start_time}")
+    log("=" * 60)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,27 @@
 
 from datetime import datetime
 from dotenv import load_dotenv
-from gtts import gTTS
 import subprocess
 import os
 import sys
 import time
 import shutil
 import hashlib
+import threading
+import json
+import tempfile
+import bisect
+import heapq
+import re
+import wave
+import math
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from tts_engines import TTSEngine, get_engine
+import mp3_frames
+import ogg_opus
+import tts_common
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -21,11 +35,30 @@ CONFIG = {
     # Настройки ввода-вывода
     "input": os.getenv("INPUT_FILE", "input.txt"),
     "output": os.getenv("OUTPUT_FILE", "output.ogg"),
-    "temp_file": os.getenv("TEMP_FILE", "temp_combined.mp3"),
     "temp_dir": os.getenv("TEMP_DIR", "tts_chunks"),
     # Параметры обработки текста
     "chunk_size": max(500, int(os.getenv("CHUNK_SIZE", 3500))),  # Минимум 500 символов
     "delay_between_chunks": max(5, int(os.getenv("DELAY_BETWEEN_CHUNKS", 20))),
+    # Параллельная обработка и ограничение частоты запросов
+    "workers": max(1, int(os.getenv("WORKERS", 1))),  # Чанков в работе одновременно
+    # Одновременных HTTP-запросов к TTS (0 - равно WORKERS)
+    "request_workers": max(0, int(os.getenv("REQUEST_WORKERS", 0))),
+    # Пул keep-alive соединений: соединений на хост (0 - по числу запросов)
+    # и число хостов, для которых пулы хранятся одновременно
+    "http_pool_size": max(0, int(os.getenv("HTTP_POOL_SIZE", 0))),
+    "http_pool_hosts": max(1, int(os.getenv("HTTP_POOL_HOSTS", 4))),
+    # HTTP-запросов в секунду (0 - чанк из CHUNK_SIZE/100 запросов
+    # за DELAY_BETWEEN_CHUNKS, как при последовательной отправке gTTS)
+    "rate_limit": max(0.0, float(os.getenv("RATE_LIMIT", 0))),
+    "rate_burst": max(1, int(os.getenv("RATE_BURST", 1))),  # Запас токенов
+    # Автоподстройка частоты (AIMD): RATE_LIMIT - стартовое значение
+    "adaptive_rate": os.getenv("ADAPTIVE_RATE", "true").lower() == "true",
+    "rate_min": max(0.001, float(os.getenv("RATE_MIN", 0.01))),
+    "rate_max": max(0.001, float(os.getenv("RATE_MAX", 10))),
+    "rate_increase": max(0.0, float(os.getenv("RATE_INCREASE", 0.01))),  # За успех
+    "rate_decrease": min(0.99, max(0.01, float(os.getenv("RATE_DECREASE", 0.5)))),
+    # Файл с найденной частотой (стартовая для следующих запусков)
+    "rate_state_file": os.getenv("RATE_STATE_FILE", ".tts_rate.json"),
     "max_filename_length": min(255, int(os.getenv("MAX_FILENAME_LENGTH", 100))),
     # Настройки аудио
     "codec": os.getenv("AUDIO_CODEC", "libopus"),
@@ -33,20 +66,93 @@ CONFIG = {
     "bitrate": os.getenv("BITRATE", "164k"),
     "sample_rate": os.getenv("SAMPLE_RATE", "48000"),
     "language": os.getenv("LANGUAGE", "ru"),
+    # Движок синтеза: gtts, pyttsx3 или fake (офлайн-заглушка для бенчмарков)
+    "engine": os.getenv("TTS_ENGINE", "gtts"),
+    "gtts_base_url": os.getenv("GTTS_BASE_URL", ""),  # Зеркало/стенд вместо Google
+    "gtts_timeout": float(os.getenv("GTTS_TIMEOUT", 30)),  # Таймаут HTTP-запроса gTTS (сек)
+    "voice": os.getenv("VOICE", "Russian"),  # Голос pyttsx3
+    "speech_rate": int(os.getenv("RATE", 150)),  # Скорость речи pyttsx3
+    "volume": float(os.getenv("VOLUME", 1.0)),  # Громкость pyttsx3
     # Параметры повторных попыток
     "max_retries": max(1, int(os.getenv("MAX_RETRIES", 5))),
     "retry_delay": max(1, int(os.getenv("RETRY_DELAY", 15))),
     "backoff_factor": max(1, int(os.getenv("BACKOFF_FACTOR", 3))),
+    "timeout_retry_delay": max(0, int(os.getenv("TIMEOUT_RETRY_DELAY", 10))),
+    # Отложенные повторы: чанк, не синтезированный из-за ошибок, уходит в
+    # очередь и повторяется через DEFERRED_DELAY*BACKOFF_FACTOR^n сек, пока
+    # синтезируются остальные (0 - без отложенных повторов)
+    "deferred_retries": max(0, int(os.getenv("DEFERRED_RETRIES", 3))),
+    "deferred_delay": max(0, int(os.getenv("DEFERRED_DELAY", 60))),
+    # Список несинтезированных чанков (JSON, по умолчанию <OUTPUT_FILE>.missing.json)
+    "missing_file": os.getenv("MISSING_CHUNKS_FILE", ""),
+    # Не собирать итоговый файл с пропусками (готовые части - для --resume)
+    "require_complete": os.getenv("REQUIRE_COMPLETE", "false").lower() == "true",
+    # Фоновое кодирование сегментами в целевой формат параллельно с синтезом
+    "incremental_encode": os.getenv("INCREMENTAL_ENCODE", "false").lower() == "true",
+    "encode_workers": max(1, int(os.getenv("ENCODE_WORKERS", os.cpu_count() or 1))),
+    # Финальное кодирование сегментами в ENCODE_WORKERS процессов FFmpeg
+    # с общей двухпроходной нормализацией громкости
+    "parallel_finalize": os.getenv("PARALLEL_FINALIZE", "false").lower() == "true",
+    # Постоянный кэш аудио чанков (пустое значение CACHE_DIR - кэш отключен)
+    "cache_dir": os.getenv("CACHE_DIR", "tts_cache"),
+    "cache_max_size_mb": max(1, int(os.getenv("CACHE_MAX_SIZE_MB", 1024))),
+    # Разбиение на чанки: greedy - подряд по CHUNK_SIZE; anchored - границы
+    # привязаны к содержимому, правка текста меняет только соседние чанки
+    "chunking": os.getenv("CHUNKING", "greedy").lower(),
+    # Аудио чанков последнего рендера документа: повторный запуск по
+    # измененному тексту синтезирует только новые чанки (пусто - отключено)
+    "render_dir": os.getenv("RENDER_DIR", ""),
+    # Повторяющиеся фрагменты текста (заголовки, дисклеймеры) синтезируются
+    # один раз за запуск; DEDUP_MAX_MB - память под их аудио
+    "dedup": os.getenv("DEDUP", "true").lower() == "true",
+    "dedup_max_size_mb": max(1, int(os.getenv("DEDUP_MAX_MB", 64))),
+    # Отчет о производительности: JSON и текстовый файл для Prometheus
+    # (node_exporter textfile collector); пустое значение - не писать
+    "metrics_file": os.getenv("METRICS_FILE", ""),
+    "prometheus_file": os.getenv("PROMETHEUS_FILE", ""),
     # Настройки выполнения
     "duration": max(0, int(os.getenv("DURATION", 0))),
     "verbose": os.getenv("VERBOSE", "true").lower() == "true",
     "overwrite": os.getenv("OVERWRITE_OUTPUT", "true").lower() == "true",
+    # Продолжение прерванной задачи по манифесту (RESUME=true или --resume)
+    "resume": os.getenv("RESUME", "false").lower() == "true" or "--resume" in sys.argv,
+    # Потоковое чтение входного файла без загрузки целиком в память
+    "stream_input": os.getenv("STREAM_INPUT", "false").lower() == "true",
+    # Части только в памяти, сразу в канал FFmpeg (без файлов и --resume)
+    "in_memory": os.getenv("IN_MEMORY", "false").lower() == "true",
+    # Чанков, на которые синтез может опередить самый ранний незавершенный
+    # (0 - 4*WORKERS); ограничивает память буфера переупорядочивания
+    "reorder_window": max(0, int(os.getenv("REORDER_WINDOW", 0))),
+    # Прогрессивный вывод: готовые части по порядку пишутся сегментами
+    # с плейлистом HLS, пока синтезируются следующие (пусто - отключен)
+    "segment_dir": os.getenv("SEGMENT_DIR", ""),
+    # Наибольшая длительность сегмента (сек); часть длиннее делится по кадрам
+    "segment_seconds": max(1.0, float(os.getenv("SEGMENT_SECONDS", 10))),
+    # Индекс "позиция в тексте -> время в аудио" рядом с итоговым файлом
+    # (по умолчанию <OUTPUT_FILE>.index.json) для перехода к абзацу или главе
+    "index": os.getenv("TEXT_INDEX", "true").lower() == "true",
+    "index_file": os.getenv("INDEX_FILE", ""),
+    # Строка-заголовок главы (регулярное выражение, без учета регистра)
+    "chapter_pattern": os.getenv(
+        "CHAPTER_PATTERN", r"^[ \t]*(?:#{1,6}[ \t]+|(?:глава|часть|chapter|part)[ \t]+)\S"
+    ),
 }
 
 
-def log(message: str, level: str = "INFO"):
-    """Расширенная система логирования с уровнями важности"""
-    if CONFIG["verbose"] or level in ("ERROR", "WARN"):
+def log_enabled(level: str) -> bool:
+    """Выводятся ли сообщения уровня level"""
+    return CONFIG["verbose"] or level in ("ERROR", "WARN")
+
+
+def log(message: str, level: str = "INFO", *args):
+    """
+    Расширенная система логирования с уровнями важности
+    args подставляются в message (message % args) только для включенного
+    уровня: в частых вызовах отключенный DEBUG не форматирует строку.
+    """
+    if log_enabled(level):
+        if args:
+            message = message % args
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         colored_level = {
             "INFO": "\033[94mINFO\033[0m",  # Синий
@@ -57,119 +163,1424 @@ def log(message: str, level: str = "INFO"):
         print(f"[{timestamp}] {colored_level} - {message}", flush=True)
 
 
-def split_text(text: str, chunk_size: int) -> list:
+# Разбиение текста - в tts_common (общий модуль со скриптом pyttsx3)
+
+
+def split_text(text: str, chunk_size: int, spans: list = None) -> list:
+    """Разбиение текста на чанки способом CHUNKING (см. tts_common.split_text)"""
+    return tts_common.split_text(text, chunk_size, spans, CONFIG["chunking"], log)
+
+
+def find_chapters(text: str, base: int = 0) -> list:
+    """
+    Заголовки глав в text по CHAPTER_PATTERN
+    Возвращает [(позиция начала заголовка + base, заголовок)]
+    """
+    pattern = re.compile(CONFIG["chapter_pattern"], re.IGNORECASE | re.MULTILINE)
+    chapters = []
+    for match in pattern.finditer(text):
+        line_end = text.find("\n", match.start())
+        line = text[match.start() : line_end if line_end != -1 else len(text)]
+        offset = match.start() + len(line) - len(line.lstrip())
+        chapters.append((base + offset, line.strip()[:200]))
+    return chapters
+
+
+def iter_chapter_blocks(blocks, chapters: list):
+    """
+    Поиск заголовков глав в потоке блоков текста (потоковый режим)
+    Блоки выдаются без изменений; заголовки ищутся по целым строкам,
+    незавершенная строка в конце блока переносится в следующий.
+    Найденные заголовки добавляются в chapters (см. find_chapters).
+    """
+    offset = 0  # Позиция tail в потоке
+    tail = ""
+    for block in blocks:
+        text = tail + block
+        cut = text.rfind("\n") + 1
+        chapters.extend(find_chapters(text[:cut], offset))
+        offset += cut
+        tail = text[cut:]
+        yield block
+    chapters.extend(find_chapters(tail, offset))
+
+
+def iter_text_blocks(path: str, block_size: int = 1 << 20):
+    """Потоковое чтение текстового файла блоками, без загрузки целиком в память"""
+    with open(path, "r", encoding="utf-8") as f:
+        for block in iter(lambda: f.read(block_size), ""):
+            yield block
+
+
+def iter_chunks(blocks, chunk_size: int, spans: list = None):
+    """Ленивое разбиение потока текста способом CHUNKING (см. tts_common.iter_chunks)"""
+    return tts_common.iter_chunks(blocks, chunk_size, spans, CONFIG["chunking"], log)
+
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты запросов (алгоритм token bucket)
+    Токены пополняются со скоростью rate в секунду, но не сверх capacity.
+    Каждый запрос к TTS забирает один токен; при их отсутствии поток ждет.
+    Один экземпляр разделяется всеми рабочими потоками.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Блокирует поток до получения токена, возвращает время ожидания (сек)"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class AdaptiveRateLimiter(TokenBucket):
     """
-    Умное разбиение текста на части с сохранением целостности структуры
-    Алгоритм:
-    1. Ищет последний подходящий разделитель в пределах chunk_size
-    2. Если разделители не найдены - делает принудительный разрыв
-    3. Объединяет слишком маленькие чанки
+    Ограничитель с автоподстройкой частоты (AIMD)
+    Каждый успешный запрос увеличивает частоту на increase (аддитивно),
+    ответ 429 или таймаут умножает ее на decrease (мультипликативно) и
+    сбрасывает накопленные токены. Частота держится в [min_rate, max_rate].
+    Повторное снижение не раньше чем через интервал 1/rate после
+    предыдущего: одновременные ошибки нескольких потоков - один сигнал.
+    История изменений хранится в history, итоговая частота - в state_file,
+    откуда берется как стартовая при следующем запуске.
     """
-    chunks = []
-    start = 0
-    text_length = len(text)
-    separators = ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " "]
 
-    log(f"Начало разбиения текста (общий размер: {text_length} символов)", "DEBUG")
+    HISTORY_SIZE = 100  # Событий в истории (в памяти и в файле состояния)
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int = 1,
+        min_rate: float = 0.01,
+        max_rate: float = 10.0,
+        increase: float = 0.01,
+        decrease: float = 0.5,
+        state_file: str = "",
+        state_key: str = "default",
+    ):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.state_file = state_file
+        self.state_key = state_key
+        self.decreased_at = 0.0
+        self.decreases = 0
+        self.history = []  # (время, частота, событие)
+
+        saved = self.load()
+        if saved:
+            self.rate = saved
+            log(f"Стартовая частота из {state_file}: {saved:.3f} запросов/сек", "INFO")
+        self.rate = min(max(self.rate, min_rate), max_rate)
+        self.record("start")
 
-    while start < text_length:
-        end = min(start + chunk_size, text_length)
+    def record(self, event: str):
+        """Запись события в историю (вызывается под блокировкой или при создании)"""
+        self.history.append((time.time(), self.rate, event))
+        del self.history[: -self.HISTORY_SIZE]
 
-        # Поиск оптимальной точки разрыва
-        if end < text_length:
-            best_pos = -1
-            for sep in separators:
-                pos = text.rfind(sep, start, end + len(sep))
-                if pos > best_pos:
-                    best_pos = pos
+    def success(self):
+        """Успешный запрос: аддитивное увеличение частоты"""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
 
-            if best_pos != -1 and (best_pos - start) > chunk_size * 0.5:
-                end = best_pos + 1  # Включаем разделитель в текущий чанк
+    def failure(self, reason: str) -> bool:
+        """
+        Перегрузка (429, таймаут): мультипликативное снижение частоты
+        Возвращает False, если снижение пропущено (недавно уже снижали)
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.decreased_at < 1 / self.rate:
+                return False
+            old_rate = self.rate
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0.0)
+            self.decreased_at = now
+            self.decreases += 1
+            self.record(reason)
+        log(
+            f"Снижение частоты ({reason}): {old_rate:.3f} → {self.rate:.3f} запросов/сек",
+            "WARN",
+        )
+        return True
 
-        chunk = text[start:end].strip()
-        if chunk:
-            chunks.append(chunk)
-            log(f"Создан чанк [{len(chunks)}] размером {len(chunk)} символов", "DEBUG")
+    def summary(self) -> str:
+        """Краткая сводка для итогового отчета"""
+        rates = [rate for _, rate, _ in self.history] + [self.rate]
+        return (
+            f"частота {self.rate:.3f} запросов/сек "
+            f"(мин. {min(rates):.3f}, макс. {max(rates):.3f}, "
+            f"снижений {self.decreases})"
+        )
+
+    def load(self) -> float:
+        """Сохраненная частота для state_key (0 - нет данных)"""
+        if not self.state_file:
+            return 0.0
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                return float(json.load(f)[self.state_key]["rate"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0.0
+
+    def save(self):
+        """Атомарная запись частоты и истории в state_file"""
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        with self.lock:
+            self.record("save")
+            state[self.state_key] = {
+                "rate": self.rate,
+                "updated": datetime.now().isoformat(timespec="seconds"),
+                "history": [
+                    {"time": round(t, 3), "rate": round(rate, 4), "event": event}
+                    for t, rate, event in self.history
+                ],
+            }
+        write_atomic(self.state_file, json.dumps(state, ensure_ascii=False, indent=2))
 
-        start = end
 
-    # Оптимизация: объединение маленьких чанков
-    if len(chunks) > 1:
-        merged = []
-        buffer = chunks[0]
-        for chunk in chunks[1:]:
-            if len(buffer) + len(chunk) <= chunk_size * 1.2:
-                buffer += " " + chunk
-                log(f"Объединение чанков [{len(merged) + 1}]", "DEBUG")
+class ChunkCache:
+    """
+    Постоянный кэш аудио чанков с адресацией по содержимому
+    Ключ - SHA-256 от (текст, язык, движок, параметры движка).
+    Запись атомарная (временный файл + os.replace), поэтому кэш можно
+    разделять между одновременными запусками. При превышении max_size
+    удаляются давно не использованные файлы (LRU по времени модификации,
+    которое обновляется при каждом попадании).
+    """
+
+    def __init__(self, cache_dir: str, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.size = None  # Оценка занятого места, вычисляется лениво
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(text: str, language: str, engine: str, options: dict) -> str:
+        """Вычисление ключа кэша для чанка"""
+        payload = json.dumps(
+            [text, language, engine, options], ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key + ext)
+
+    def get(self, key: str, dest: str) -> bool:
+        """
+        Копирует аудио из кэша в dest, возвращает True при попадании
+        Жесткая ссылка (или копия) создается под временным именем и
+        заменяет dest атомарно: часть, оставшаяся от прерванного запуска
+        (в том числе ссылка на этот же файл кэша), не мешает попаданию
+        """
+        path = self.path(key, os.path.splitext(dest)[1])
+        tmp_path = dest + ".cache.tmp"
+        try:
+            os.utime(path)  # Отметка использования для LRU
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            try:
+                os.link(path, tmp_path)
+            except OSError:
+                shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, dest)
+            if os.path.lexists(tmp_path):
+                # dest уже был ссылкой на тот же файл: rename ничего не делает
+                os.remove(tmp_path)
+        except OSError:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            return self._count(False)
+        return self._count(True)
+
+    def get_data(self, key: str, ext: str) -> bytes:
+        """Аудио из кэша в памяти (None - промах)"""
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self._count(False)
+            return None
+        self._count(True)
+        return data
+
+    def _count(self, hit: bool) -> bool:
+        with self.lock:
+            if hit:
+                self.hits += 1
             else:
-                merged.append(buffer)
-                buffer = chunk
-        merged.append(buffer)
-        log(f"Оптимизация чанков: {len(chunks)} → {len(merged)}", "DEBUG")
-        return merged
+                self.misses += 1
+        return hit
 
-    return chunks
+    def put(self, key: str, src: str):
+        """Атомарно сохраняет файл src в кэш и при необходимости вытесняет старые"""
+        with open(src, "rb") as f:
+            self.put_data(key, os.path.splitext(src)[1], f.read())
 
+    def put_data(self, key: str, ext: str, data: bytes):
+        """Атомарно сохраняет аудио из памяти в кэш"""
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as dst:
+                dst.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self.lock:
+            if self.size is None:
+                self.size = self._scan_size()
+            else:
+                self.size += os.path.getsize(path)
+            if self.size > self.max_size:
+                self.evict()
 
-def generate_tts(text: str, output_file: str) -> bool:
+    def _entries(self) -> list:
+        """Список (mtime, размер, путь) всех файлов кэша"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue  # Незавершенная запись
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # Удален параллельным процессом
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Удаление наименее востребованных файлов до попадания в лимит"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        self.size = total
+        log(f"Кэш: вытеснено {removed} файлов, занято {total / 2**20:.1f} МБ", "DEBUG")
+
+
+class RenderStore:
     """
-    Генерация аудиофайла через Google TTS с экспоненциальной задержкой при ошибках
-    Возвращает:
-        True - успешная генерация
-        False - неудача после всех попыток
+    Аудио чанков последнего рендера документа (RENDER_DIR)
+    Части хранятся по тем же ключам, что и в ChunkCache, но без вытеснения
+    по размеру: повторный запуск по измененному тексту берет отсюда
+    неизмененные чанки и синтезирует только новые (с CHUNKING=anchored
+    правка затрагивает лишь соседние чанки). Промахи ищутся в общем кэше
+    fallback, новые части пишутся в оба. После успешной сборки prune()
+    удаляет части, не вошедшие в рендер, и записывает render.json.
     """
-    log(f"Инициализация генерации TTS для файла {output_file}", "DEBUG")
 
-    for attempt in range(CONFIG["max_retries"] + 1):
+    RECORD = "render.json"
+
+    def __init__(self, directory: str, fallback: ChunkCache = None):
+        self.store = ChunkCache(directory, 2**63)
+        self.fallback = fallback
+        self.used = set()  # Ключи чанков текущего рендера
+        self.cached = 0  # Промахи рендера, найденные в общем кэше
+        self.lock = threading.Lock()
+
+    @property
+    def hits(self) -> int:
+        return self.store.hits
+
+    @property
+    def misses(self) -> int:
+        """Чанки, которых не было ни в рендере, ни в общем кэше"""
+        return self.store.misses - self.cached
+
+    def _cached(self):
+        with self.lock:
+            self.cached += 1
+
+    def _use(self, key: str):
+        with self.lock:
+            self.used.add(key)
+
+    def get(self, key: str, dest: str) -> bool:
+        self._use(key)
+        if self.store.get(key, dest):
+            return True
+        if self.fallback and self.fallback.get(key, dest):
+            self._cached()
+            self.store.put(key, dest)
+            return True
+        return False
+
+    def get_data(self, key: str, ext: str) -> bytes:
+        self._use(key)
+        data = self.store.get_data(key, ext)
+        if data is None and self.fallback:
+            data = self.fallback.get_data(key, ext)
+            if data is not None:
+                self._cached()
+                self.store.put_data(key, ext, data)
+        return data
+
+    def put(self, key: str, src: str):
+        self._use(key)
+        self.store.put(key, src)
+        if self.fallback:
+            self.fallback.put(key, src)
+
+    def put_data(self, key: str, ext: str, data: bytes):
+        self._use(key)
+        self.store.put_data(key, ext, data)
+        if self.fallback:
+            self.fallback.put_data(key, ext, data)
+
+    def prune(self, **record):
+        """Удаление частей прошлых рендеров и запись render.json"""
+        removed = 0
+        for _, _, path in self.store._entries():
+            key = os.path.splitext(os.path.basename(path))[0]
+            if key not in self.used and os.path.basename(path) != self.RECORD:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+        record = {
+            "version": 1,
+            "chunks": len(self.used),
+            "reused": self.hits,
+            "cached": self.cached,
+            "synthesized": self.misses,
+            **record,
+        }
+        write_atomic(
+            os.path.join(self.store.cache_dir, self.RECORD),
+            json.dumps(record, ensure_ascii=False, indent=2),
+        )
+        log(f"Рендер: удалено устаревших частей {removed}", "DEBUG")
+
+
+def file_sha256(path: str) -> str:
+    """Хэш содержимого файла (читается блоками, без загрузки в память)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class JobManifest:
+    """
+    Манифест задачи конвертации для возобновления после сбоя
+    Хранится рядом с выходным файлом (<OUTPUT_FILE>.job.json) и содержит
+    отпечаток входных данных, план разбиения и статус каждого чанка
+    с путем к его аудио. Перезаписывается атомарно после каждого чанка.
+    План пополняется по мере разбиения (add), что позволяет вести манифест
+    и в потоковом режиме, когда число чанков заранее неизвестно.
+    """
+
+    def __init__(self, path: str, fingerprint: dict):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.chunks = []
+        self.planned = False  # План разбиения полностью построен
+        self.previous = []  # Чанки предыдущего запуска (для возобновления)
+
+    def restore(self) -> bool:
+        """
+        Загрузка манифеста предыдущего запуска
+        Возвращает True, если отпечаток входных данных совпал и готовые
+        чанки можно переиспользовать (проверяются по мере вызова add)
+        """
         try:
-            tts = gTTS(
-                text=text,
-                lang=CONFIG["language"],
-                lang_check=False,  # Отключаем проверку для нестандартных текстов
-                slow=False,
-                timeout=30,  # Максимальное время ожидания ответа
+            with open(self.path, "r", encoding="utf-8") as f:
+                previous = json.load(f)
+        except FileNotFoundError:
+            log(f"Манифест {self.path} не найден, задача начнется заново", "WARN")
+            return False
+        except (OSError, ValueError) as e:
+            log(f"Манифест {self.path} поврежден: {str(e)}", "WARN")
+            return False
+
+        if previous.get("fingerprint") != self.fingerprint:
+            log("Входные данные или параметры изменились, задача начнется заново", "WARN")
+            return False
+
+        self.previous = previous.get("chunks", [])
+        return True
+
+    def add(self, chunk: str):
+        """
+        Добавление очередного чанка в план
+        Возвращает путь к аудио, если чанк уже готов по предыдущему запуску
+        (совпадает хэш текста и файл сохранился), иначе None
+        """
+        idx = len(self.chunks)
+        entry = {
+            "hash": hashlib.sha256(chunk.encode("utf-8")).hexdigest()[:16],
+            "chars": len(chunk),
+            "status": "pending",
+            "audio": None,
+        }
+        self.chunks.append(entry)
+
+        if idx < len(self.previous):
+            old = self.previous[idx]
+            if (
+                old["hash"] == entry["hash"]
+                and old["status"] == "done"
+                and old["audio"]
+                and os.path.exists(old["audio"])
+            ):
+                entry["status"] = "done"
+                entry["audio"] = old["audio"]
+        return entry["audio"]
+
+    def mark(self, idx: int, status: str, audio: str = None):
+        """Обновление статуса чанка с немедленным сохранением манифеста"""
+        self.chunks[idx]["status"] = status
+        self.chunks[idx]["audio"] = os.path.abspath(audio) if audio else None
+        self.save()
+
+    def save(self, finished: bool = False):
+        """
+        Атомарная запись манифеста на диск
+        finished=True отмечает, что план разбиения построен полностью;
+        отметка сохраняется и при последующих записях
+        """
+        self.planned = self.planned or finished
+        data = {
+            "version": 1,
+            "fingerprint": self.fingerprint,
+            "planned": self.planned,
+            "chunks": self.chunks,
+        }
+        write_atomic(self.path, json.dumps(data, ensure_ascii=False))
+
+
+# Счетчики выполнения (для итогового отчета и бенчмарков)
+STATS = {
+    "requests": 0,  # Попыток синтеза, включая повторы
+    "retries": 0,
+    "throttled": 0,  # Ответов 429
+    "timeouts": 0,
+    "sleep_seconds": 0.0,  # Паузы после ошибок
+    "limiter_wait_seconds": 0.0,  # Ожидание ограничителя частоты
+    "dedup_hits": 0,  # Фрагментов, взятых из уже синтезированных
+    "dedup_seconds": 0.0,  # Сэкономленное время запросов (сек, по первому вхождению)
+    "audio_bytes": 0,  # Получено аудио от движка
+    "deferred": 0,  # Чанков, отложенных для повтора
+}
+_stats_lock = threading.Lock()
+
+# Границы корзин гистограмм длительности (сек)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class Histogram:
+    """Гистограмма длительностей с корзинами "не больше границы" (как в Prometheus)"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self) -> list:
+        """[(граница, число значений не больше нее)], последняя граница - +Inf"""
+        total = 0
+        result = []
+        for bound, value in zip((*self.buckets, float("inf")), self.counts):
+            total += value
+            result.append((bound, total))
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "max": round(self.max, 6),
+            "avg": round(self.sum / self.count, 6) if self.count else 0.0,
+            "buckets": {
+                "+Inf" if bound == float("inf") else str(bound): value
+                for bound, value in self.cumulative()
+            },
+        }
+
+
+# Длительности этапов (этап -> [сек, вызовов]) и гистограммы задержек
+STAGES = {}
+HISTOGRAMS = {
+    "request_seconds": Histogram(),  # Одна попытка HTTP-запроса к TTS
+    "chunk_seconds": Histogram(),  # Синтез чанка целиком (без кэша)
+    "encode_seconds": Histogram(),  # Фоновое кодирование части
+}
+
+
+def count(name: str, value=1):
+    """Потокобезопасное увеличение счетчика STATS"""
+    with _stats_lock:
+        STATS[name] += value
+
+
+def observe(name: str, seconds: float):
+    """Потокобезопасная запись длительности в гистограмму HISTOGRAMS"""
+    with _stats_lock:
+        HISTOGRAMS[name].observe(seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Замер длительности этапа (суммируется при повторных вызовах)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _stats_lock:
+            total = STAGES.setdefault(stage, [0.0, 0])
+            total[0] += elapsed
+            total[1] += 1
+
+
+def reset_metrics():
+    """Обнуление счетчиков, этапов и гистограмм (бенчмарки, несколько прогонов)"""
+    with _stats_lock:
+        for name in STATS:
+            STATS[name] = 0
+        STAGES.clear()
+        for name in HISTOGRAMS:
+            HISTOGRAMS[name] = Histogram()
+
+
+def metrics_report(**gauges) -> dict:
+    """Снимок всех метрик; gauges - итоговые значения запуска (размер файла и т.п.)"""
+    with _stats_lock:
+        return {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "engine": CONFIG["engine"],
+            "counters": dict(STATS),
+            "gauges": gauges,
+            "stages": {
+                stage: {"seconds": round(seconds, 6), "calls": calls}
+                for stage, (seconds, calls) in STAGES.items()
+            },
+            "histograms": {name: h.to_dict() for name, h in HISTOGRAMS.items()},
+        }
+
+
+def prometheus_text(report: dict) -> str:
+    """Метрики отчета metrics_report в текстовом формате Prometheus (префикс tts_)"""
+    lines = []
+    for name, value in report["counters"].items():
+        lines += [f"# TYPE tts_{name}_total counter", f"tts_{name}_total {value}"]
+    for name, value in report["gauges"].items():
+        lines += [f"# TYPE tts_{name} gauge", f"tts_{name} {float(value)}"]
+    lines.append("# TYPE tts_stage_seconds gauge")
+    for stage, values in report["stages"].items():
+        lines.append(f'tts_stage_seconds{{stage="{stage}"}} {values["seconds"]}')
+    for name, histogram in report["histograms"].items():
+        lines.append(f"# TYPE tts_{name} histogram")
+        for le, value in histogram["buckets"].items():
+            lines.append(f'tts_{name}_bucket{{le="{le}"}} {value}')
+        lines += [f"tts_{name}_sum {histogram['sum']}", f"tts_{name}_count {histogram['count']}"]
+    return "\n".join(lines) + "\n"
+
+
+# Маска прав процесса (os.umask читается только вместе с установкой)
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+
+def write_atomic(path: str, text: str):
+    """
+    Запись файла через временный и os.replace (читатель не видит половину)
+    Права - как у обычного open (0666 с учетом umask), а не 0600 от mkstemp:
+    плейлист и индекс читают плеер и веб-сервер от другого пользователя
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.chmod(tmp_path, 0o666 & ~UMASK)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(**gauges):
+    """Запись отчета в METRICS_FILE (JSON) и PROMETHEUS_FILE, если они заданы"""
+    if not (CONFIG["metrics_file"] or CONFIG["prometheus_file"]):
+        return
+    report = metrics_report(**gauges)
+    try:
+        if CONFIG["metrics_file"]:
+            write_atomic(
+                CONFIG["metrics_file"], json.dumps(report, ensure_ascii=False, indent=2)
             )
-            tts.save(output_file)
-            log(f"Успешная генерация {output_file} (попытка {attempt + 1})", "DEBUG")
-            return True
+            log(f"Метрики: {os.path.abspath(CONFIG['metrics_file'])}", "INFO")
+        if CONFIG["prometheus_file"]:
+            write_atomic(CONFIG["prometheus_file"], prometheus_text(report))
+    except OSError as e:
+        log(f"Не удалось записать метрики: {str(e)}", "WARN")
+
+
+def create_engine() -> TTSEngine:
+    """Долгоживущий движок синтеза, выбранный в TTS_ENGINE"""
+    options = {
+        "gtts": {
+            "language": CONFIG["language"],
+            "base_url": CONFIG["gtts_base_url"],
+            "timeout": CONFIG["gtts_timeout"],
+            "pool_size": CONFIG["http_pool_size"]
+            or CONFIG["request_workers"]
+            or CONFIG["workers"],
+            "pool_hosts": CONFIG["http_pool_hosts"],
+        },
+        "pyttsx3": {
+            "voice": CONFIG["voice"],
+            "rate": CONFIG["speech_rate"],
+            "volume": CONFIG["volume"],
+        },
+    }.get(CONFIG["engine"], {})
+    return get_engine(CONFIG["engine"], **options)
+
+
+class PermanentTTSError(Exception):
+    """Ошибка синтеза, которую повтор не исправит (язык, токен, ответ без аудио)"""
+
+
+def request_tts(
+    engine: TTSEngine,
+    unit,
+    label: str,
+    limiter: TokenBucket = None,
+    defer: bool = False,
+) -> bytes:
+    """
+    Одна единица запроса к движку (engine.plan) с повторами при перегрузке
+    Каждая попытка (включая повторы) к сетевому движку предварительно
+    получает токен у limiter. Адаптивный limiter сам снижает частоту при
+    429 и таймаутах, и повтор просто ждет следующего токена; с обычным
+    TokenBucket используется экспоненциальная задержка.
+    defer=True - вместо экспоненциальной задержки после 429 запрос сразу
+    завершается неудачей: чанк уходит в очередь отложенных повторов и не
+    занимает поток паузой. Постоянная ошибка (не перегрузка, не таймаут и
+    не сбой соединения) в этом режиме вызывает PermanentTTSError - такой
+    чанк откладывать бессмысленно.
+    Возвращает аудио или None при неудаче после всех попыток
+    """
+    adaptive = isinstance(limiter, AdaptiveRateLimiter) and engine.rate_limited
+
+    for attempt in range(CONFIG["max_retries"] + 1):
+        if limiter and engine.rate_limited:
+            waited = limiter.acquire()
+            if waited > 0:
+                count("limiter_wait_seconds", waited)
+                log("Ожидание лимита запросов %.1f сек", "DEBUG", waited)
+        count("requests")
+        if attempt:
+            count("retries")
+        started = time.perf_counter()
+        try:
+            audio = engine.fetch(unit)
+            observe("request_seconds", time.perf_counter() - started)
+            count("audio_bytes", len(audio))
+            if adaptive:
+                limiter.success()
+            log("Успешный запрос %s (попытка %d)", "DEBUG", label, attempt + 1)
+            return audio
         except Exception as e:
+            observe("request_seconds", time.perf_counter() - started)
             error_msg = str(e).lower()
 
             # Обработка ошибки перегрузки сервера
             if "429" in error_msg or "too many requests" in error_msg:
+                count("throttled")
+                if adaptive:
+                    limiter.failure("429")
+                    log(
+                        f"Ошибка 429: Превышен лимит запросов. Попытка {attempt + 1}/{CONFIG['max_retries']}",
+                        "WARN",
+                    )
+                    continue
+                if defer:
+                    log(f"Ошибка 429: {label} будет повторен позже", "WARN")
+                    return None
                 delay = CONFIG["retry_delay"] * (CONFIG["backoff_factor"] ** attempt)
                 log(
                     f"Ошибка 429: Превышен лимит запросов. Попытка {attempt + 1}/{CONFIG['max_retries']} через {delay} сек",
                     "WARN",
                 )
+                count("sleep_seconds", delay)
                 time.sleep(delay)
 
-            # Обработка сетевых ошибок
-            elif "timed out" in error_msg:
+            # Обработка сетевых ошибок (включая 504 Gateway Timeout)
+            elif "timed out" in error_msg or "timeout" in error_msg:
                 log(
                     f"Таймаут подключения. Попытка {attempt + 1}/{CONFIG['max_retries']}",
                     "WARN",
                 )
-                time.sleep(10)
+                count("timeouts")
+                if adaptive:
+                    limiter.failure("timeout")
+                    continue
+                count("sleep_seconds", CONFIG["timeout_retry_delay"])
+                time.sleep(CONFIG["timeout_retry_delay"])
 
             else:
                 log(
                     f"Критическая ошибка генерации: {type(e).__name__} - {str(e)}",
                     "ERROR",
                 )
-                return False
+                # Сбой соединения и ошибка 5xx сервиса проходят сами
+                transient = any(
+                    marker in error_msg
+                    for marker in ("failed to connect", "connection", "try again later")
+                )
+                if defer and not transient:
+                    raise PermanentTTSError(f"{label}: {str(e)}") from e
+                return None
+
+    log(f"Достигнут максимум попыток для {label}", "ERROR")
+    return None
+
+
+class SegmentDedup:
+    """
+    Однократный синтез повторяющихся фрагментов текста
+    Единицы запроса движка (для gTTS - предложения и фразы до ~100
+    символов) с одинаковым ключом engine.unit_key дают одно и то же аудио.
+    Первое вхождение синтезируется, остальные получают готовое аудио -
+    в том числе ожидая запрос, который уже выполняется в другом потоке.
+    Аудио хранится в памяти не более max_size байт; при переполнении
+    вытесняются давно не использованные фрагменты (LRU).
+    """
+
+    def __init__(self, engine: TTSEngine, max_size: int):
+        self.engine = engine
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()  # Ключ -> (аудио, время его запроса)
+        self.inflight = {}  # Ключ -> Event запроса в работе
+        self.lock = threading.Lock()
+
+    def fetch(self, unit, produce):
+        """Аудио единицы unit; produce() синтезирует его при первом вхождении"""
+        key = self.engine.unit_key(unit)
+        if key is None:
+            return produce()
+        while True:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None:
+                    self.entries.move_to_end(key)
+                    count("dedup_hits")
+                    count("dedup_seconds", entry[1])
+                    return entry[0]
+                event = self.inflight.get(key)
+                if event is None:
+                    event = self.inflight[key] = threading.Event()
+                    break
+            # Тот же фрагмент уже запрашивается: ждем его результат (после
+            # неудачи первого запроса следующий поток запрашивает сам)
+            event.wait()
+
+        audio = None
+        start = time.monotonic()
+        try:
+            audio = produce()
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                if audio and len(audio) <= self.max_size:
+                    self._store(key, audio, time.monotonic() - start)
+            event.set()
+        return audio
+
+    def _store(self, key: str, audio: bytes, seconds: float):
+        """
+        Сохранение аудио с вытеснением старых фрагментов (под блокировкой)
+        seconds - время запроса первого вхождения (с ожиданием лимита и
+        повторами): столько экономит каждое следующее
+        """
+        self.entries[key] = (audio, seconds)
+        self.size += len(audio)
+        while self.size > self.max_size:
+            _, (old, _) = self.entries.popitem(last=False)
+            self.size -= len(old)
+
+
+def fetch_unit(
+    engine: TTSEngine,
+    unit,
+    label: str,
+    limiter: TokenBucket = None,
+    dedup: SegmentDedup = None,
+    defer: bool = False,
+) -> bytes:
+    """Единица запроса через dedup (если задан), иначе напрямую request_tts"""
+    if dedup is None:
+        return request_tts(engine, unit, label, limiter, defer)
+    return dedup.fetch(unit, lambda: request_tts(engine, unit, label, limiter, defer))
+
+
+def synthesize_audio(
+    engine: TTSEngine,
+    text: str,
+    label: str,
+    limiter: TokenBucket = None,
+    pool: ThreadPoolExecutor = None,
+    dedup: SegmentDedup = None,
+    defer: bool = False,
+) -> bytes:
+    """
+    Синтез текста движком TTS в память
+    Текст делится на единицы запроса движка (для gTTS - HTTP-запрос на
+    ~100 символов). Каждая повторяется отдельно, поэтому ошибка одного
+    запроса не перезапускает весь чанк. С pool запросы выполняются
+    параллельно общим пулом, аудио склеивается в исходном порядке.
+    С dedup уже синтезированные фрагменты берутся без запроса.
+    defer - см. request_tts.
+    Возвращает аудио или None при неудаче после всех попыток
+    """
+    units = engine.plan(text)
+    labels = [f"{label} [{i + 1}/{len(units)}]" for i in range(len(units))]
+
+    if pool is None or len(units) == 1:
+        segments = []
+        for unit, label in zip(units, labels):
+            audio = fetch_unit(engine, unit, label, limiter, dedup, defer)
+            if audio is None:
+                return None
+            segments.append(audio)
+    else:
+        futures = [
+            pool.submit(fetch_unit, engine, unit, label, limiter, dedup, defer)
+            for unit, label in zip(units, labels)
+        ]
+        segments = []
+        try:
+            for future in futures:
+                audio = future.result()
+                if audio is None:
+                    return None  # Остальные запросы чанка отменяются ниже
+                segments.append(audio)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    log("Успешная генерация %s (%d запросов)", "DEBUG", label, len(units))
+    return b"".join(segments)
+
+
+def generate_tts(
+    engine: TTSEngine,
+    text: str,
+    output_file: str,
+    limiter: TokenBucket = None,
+    pool: ThreadPoolExecutor = None,
+    dedup: SegmentDedup = None,
+    defer: bool = False,
+) -> bool:
+    """
+    Генерация аудиофайла движком TTS (см. synthesize_audio)
+    Возвращает:
+        True - успешная генерация
+        False - неудача после всех попыток
+    """
+    log("Инициализация генерации TTS для файла %s", "DEBUG", output_file)
+    audio = synthesize_audio(engine, text, output_file, limiter, pool, dedup, defer)
+    if audio is None:
+        return False
+    # Новый файл вместо перезаписи: прежняя часть может быть жесткой
+    # ссылкой на файл кэша, который нельзя менять на месте
+    with open(output_file + ".tmp", "wb") as f:
+        f.write(audio)
+    os.replace(output_file + ".tmp", output_file)
+    return True
+
+
+def process_chunk(
+    engine: TTSEngine,
+    idx: int,
+    chunk: str,
+    total: int,
+    limiter: TokenBucket,
+    cache: ChunkCache = None,
+    pool: ThreadPoolExecutor = None,
+    in_memory: bool = False,
+    temp_dir: str = None,
+    dedup: SegmentDedup = None,
+    defer: bool = False,
+):
+    """
+    Генерация аудио для одного чанка (выполняется в рабочем потоке)
+    При попадании в кэш запрос к TTS не выполняется
+    Возвращает путь к файлу части в temp_dir (по умолчанию TEMP_DIR;
+    in_memory - аудио в памяти, файл не создается) или None при неудаче
+    """
+    chunk_hash = hashlib.md5(chunk.encode()).hexdigest()[:8]
+    part_file = os.path.join(
+        temp_dir or CONFIG["temp_dir"],
+        f"part_{idx + 1:04d}_{chunk_hash}.{engine.audio_format}",
+    )
+
+    log("[%d/%s] Обработка чанка %s", "INFO", idx + 1, total or "?", part_file)
+    if log_enabled("DEBUG"):
+        preview = chunk[:50].replace("\n", " ")
+        log(f"Содержимое чанка (первые 50 символов): {preview}...", "DEBUG")
+
+    cache_key = None
+    if cache:
+        cache_key = ChunkCache.key(
+            chunk, CONFIG["language"], engine.name, engine.options()
+        )
+
+    if in_memory:
+        audio = cache.get_data(cache_key, "." + engine.audio_format) if cache else None
+        if audio is not None:
+            log("[%d/%s] Чанк взят из кэша", "DEBUG", idx + 1, total or "?")
+            return audio
+        started = time.perf_counter()
+        audio = synthesize_audio(engine, chunk, part_file, limiter, pool, dedup, defer)
+        observe("chunk_seconds", time.perf_counter() - started)
+        if cache and audio:
+            try:
+                cache.put_data(cache_key, "." + engine.audio_format, audio)
+            except OSError as e:
+                log(f"Не удалось сохранить чанк в кэш: {str(e)}", "WARN")
+        return audio
+
+    if cache and cache.get(cache_key, part_file):
+        log("[%d/%s] Чанк взят из кэша", "DEBUG", idx + 1, total or "?")
+        return part_file
+
+    started = time.perf_counter()
+    generated = generate_tts(engine, chunk, part_file, limiter, pool, dedup, defer)
+    observe("chunk_seconds", time.perf_counter() - started)
+    if generated:
+        if cache and os.path.getsize(part_file) > 0:
+            try:
+                cache.put(cache_key, part_file)
+            except OSError as e:
+                log(f"Не удалось сохранить чанк в кэш: {str(e)}", "WARN")
+        return part_file
+    return None
+
+
+LOUDNORM_I = -16.0  # Целевая интегральная громкость (LUFS)
+LOUDNORM_TP = -1.5  # Предельный истинный пик (dBTP)
+LOUDNORM = f"I={LOUDNORM_I:g}:LRA=11:TP={LOUDNORM_TP:g}"  # Параметры нормализации звука
+OPUS_PRE_SKIP = 312  # Задержка кодера libopus (отсчетов 48 кГц)
+MP3_DELAY = 576 + 529  # Задержка кодера LAME и декодера MP3 (отсчетов)
+ENCODE_SEGMENT_SECONDS = 60  # Длительность сегмента фонового кодирования
+
+
+def encode_args() -> list:
+    """Параметры кодирования в конечный формат для командной строки FFmpeg"""
+    return [
+        "-c:a",
+        CONFIG["codec"],
+        "-ar",
+        CONFIG["sample_rate"],
+        "-ac",
+        CONFIG["channels"],
+        "-b:a",
+        CONFIG["bitrate"],
+    ]
+
+
+def measure_loudness(path: str, concat: bool = False) -> dict:
+    """
+    Измерение громкости файла (первый проход loudnorm)
+    concat=True - path является списком concat-демультиплексора
+    Возвращает словарь loudnorm: input_i, input_tp, input_lra,
+    input_thresh, target_offset
+    """
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostats",
+        *(["-f", "concat", "-safe", "0"] if concat else []),
+        "-i",
+        path,
+        "-af",
+        f"loudnorm={LOUDNORM}:print_format=json",
+        "-f",
+        "null",
+        "-",
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    # JSON с результатами - последний блок {...} в stderr
+    report = result.stderr[result.stderr.rindex("{") : result.stderr.rindex("}") + 1]
+    return json.loads(report)
+
+
+def loudness_gain(measured: dict) -> str:
+    """
+    Фильтр постоянного усиления до LOUDNORM_I по измеренной громкости
+    Усиление ограничено так, чтобы пик не превысил LOUDNORM_TP (loudnorm
+    в таком случае перешел бы в динамический режим). Для тишины (громкость
+    -inf) нормализовать нечего - фильтр не применяется
+    """
+    if not -99 <= float(measured["input_i"]) <= 0:
+        return "anull"
+    gain = min(
+        LOUDNORM_I - float(measured["input_i"]),
+        LOUDNORM_TP - float(measured["input_tp"]),
+    )
+    return f"volume={gain:.2f}dB"
+
+
+def seam_grid(output: str = None):
+    """
+    Сетка кадров для склейки сегментов без перекодирования
+    Возвращает (кадр, задержка) в отсчетах SAMPLE_RATE: кадр кодека и
+    задержка от начала входа до начала первого кадра. None - склейка для
+    кодека и контейнера output (по умолчанию OUTPUT_FILE) не поддерживается
+    (нужно кодирование одним проходом)
+    """
+    rate = int(CONFIG["sample_rate"])
+    ext = os.path.splitext(output or CONFIG["output"])[1].lower()
+    if CONFIG["codec"] == "libopus" and ext in (".ogg", ".opus"):
+        if ogg_opus.OPUS_RATE % rate == 0:
+            return rate // 50, OPUS_PRE_SKIP * rate // ogg_opus.OPUS_RATE
+    if CONFIG["codec"] == "libmp3lame" and ext == ".mp3":
+        return 1152 if rate >= 32000 else 576, MP3_DELAY
+    return None
+
+
+def next_seam(position: int, grid: tuple) -> int:
+    """
+    Ближайшая к position (не раньше) граница сегмента
+    Границы - начала кадров кодера, запущенного с начала шкалы: k*кадр -
+    задержка. Кадры сегмента, закодированного с перекрытием, попадают на
+    ту же сетку, поэтому соседние сегменты стыкуются по границе кадра.
+    """
+    frame, delay = grid
+    return -(-(position + delay) // frame) * frame - delay
+
+
+def seam_overlap(grid: tuple) -> int:
+    """
+    Перекрытие сегментов (отсчетов): кодер начинает раньше границы на
+    несколько кадров, чтобы к ней он уже был "разогрет" тем же звуком, что
+    и кодер предыдущего сегмента; лишние кадры отбрасываются при склейке
+    """
+    frame, delay = grid
+    return (delay // frame + 5) * frame - delay
+
+
+def decode_pcm(src: str, dst: str) -> int:
+    """
+    Декодирование части в WAV с частотой и каналами результата
+    Возвращает число отсчетов - по ним части укладываются на общую шкалу
+    """
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-i",
+        src,
+        "-ar",
+        CONFIG["sample_rate"],
+        "-ac",
+        CONFIG["channels"],
+        "-c:a",
+        "pcm_s16le",
+        dst,
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        log(f"Ошибка декодирования {src}: {e.stderr}", "ERROR")
+        raise
+    with wave.open(dst, "rb") as f:
+        return f.getnframes()
+
+
+def encode_span(
+    pcm: list, start: int, end: int, grid: tuple, audio_filter: str, dst: str
+) -> tuple:
+    """
+    Кодирование участка [start, end) общей шкалы частей в файл dst
+    pcm - [(WAV, начало на шкале, отсчетов)] по порядку шкалы. Кодер
+    получает звук с перекрытием слева (seam_overlap) и справа, поэтому
+    кадры на границах участка закодированы так же, как в соседних.
+    Возвращает (dst, пропустить, взять) для join_segments: отсчеты кадров
+    перекрытия и отсчеты самого участка (0 - до конца файла)
+    """
+    frame, delay = grid
+    total = pcm[-1][1] + pcm[-1][2]
+    overlap = seam_overlap(grid) if start else 0
+    first = start - overlap
+    last = min(total, end + seam_overlap(grid) + delay + frame)
+    files = [item for item in pcm if item[1] < last and item[1] + item[2] > first]
+    base = files[0][1]
+    concat_list = write_concat_list(
+        [path for path, _, _ in files], os.path.dirname(dst), os.path.basename(dst) + ".txt"
+    )
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-i",
+        concat_list,
+        "-af",
+        f"atrim=start_sample={first - base}:end_sample={last - base},"
+        f"asetpts=N/SR/TB,{audio_filter}",
+        *encode_args(),
+        # Без резервуара бит кадр MP3 не ссылается на данные предыдущих
+        *(["-reservoir", "0"] if CONFIG["codec"] == "libmp3lame" else []),
+        dst,
+    ]
+    started = time.perf_counter()
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, text=True)
+    except subprocess.CalledProcessError as e:
+        log(f"Ошибка кодирования сегмента {dst}: {e.stderr}", "ERROR")
+        raise
+    finally:
+        os.remove(concat_list)
+    observe("encode_seconds", time.perf_counter() - started)
+    log("Сегмент закодирован: %s", "DEBUG", dst)
+    skip = overlap + delay if start else 0
+    take = 0 if end >= total else end - start + (0 if start else delay)
+    return dst, skip, take
+
+
+def join_segments(segments: list, total: int, output: str = None):
+    """
+    Склейка сегментов encode_span в итоговый файл без перекодирования
+    Из каждого сегмента берутся только кадры его участка шкалы: стык
+    приходится на границу кадра, а задержка кодера остается одна - в
+    начале файла. total - длина шкалы (отсчетов), по ней обрезается конец
+    Ogg Opus
+    """
+    output = output or CONFIG["output"]
+    if os.path.exists(output) and not CONFIG["overwrite"]:
+        raise FileExistsError(f"Файл {output} уже существует")
+    rate = int(CONFIG["sample_rate"])
+    if CONFIG["duration"] > 0:
+        total = min(total, CONFIG["duration"] * rate)
+    with open(output, "wb") as out:
+        if CONFIG["codec"] == "libmp3lame":
+            result = mp3_frames.concat_files(
+                [path for path, _, _ in segments],
+                out,
+                max_seconds=CONFIG["duration"],
+                ranges=[(skip, take) for _, skip, take in segments],
+            )
+        else:
+            scale = ogg_opus.OPUS_RATE // rate
+            result = ogg_opus.concat_files(
+                [(path, skip * scale, take * scale) for path, skip, take in segments],
+                out,
+                total * scale,
+            )
+    log(f"Склеено сегментов {len(segments)}, длительность {result['seconds']:.1f} сек", "DEBUG")
+
+
+class ChunkEncoder:
+    """
+    Фоновое кодирование итогового файла сегментами параллельно с синтезом
+    Готовые части декодируются в WAV (decode_pcm) и измеряются по мере
+    поступления. Как только части подряд с начала покрывают очередной
+    сегмент (около ENCODE_SEGMENT_SECONDS), он кодируется с перекрытием
+    (encode_span); в конце сегменты склеиваются без швов (join_segments).
+    Громкость: сегмент получает постоянное усиление по интегральной
+    громкости всех частей, измеренных к моменту его кодирования (среднее
+    по энергии с весом длительности). Это текущая оценка громкости всего
+    потока: первые сегменты кодируются по неполным данным, и при заметной
+    смене громкости голоса по ходу текста усиление сегментов различается.
+    Точное измерение всего файла дают обычная сборка и PARALLEL_FINALIZE.
+    """
+
+    def __init__(self, workers: int, grid: tuple, temp_dir: str = None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encode")
+        self.grid = grid
+        self.temp_dir = temp_dir or CONFIG["temp_dir"]
+        self.ext = os.path.splitext(CONFIG["output"])[1]
+        self.length = int(ENCODE_SEGMENT_SECONDS * int(CONFIG["sample_rate"]))
+        self.lock = threading.Lock()
+        self.ready = {}  # Номер чанка -> (WAV, отсчетов)
+        self.next_idx = 0  # Первый чанк, еще не уложенный на шкалу
+        self.pcm = []  # (WAV, начало на шкале, отсчетов) частей подряд с начала
+        self.released = 0  # WAV до этого номера в pcm уже удалены
+        self.total = 0  # Длина шкалы (отсчетов)
+        self.start = 0  # Начало следующего сегмента на шкале
+        self.energy = 0.0  # Сумма энергии частей для оценки громкости
+        self.measured = 0  # Отсчетов в измеренных частях
+        self.peak = -99.0  # Наибольший истинный пик частей (dBTP)
+        self.prepared = []  # Future подготовки частей
+        self.segments = []  # (начало перекрытия, Future кодирования сегмента)
+
+    def submit(self, idx: int, src: str):
+        """Постановка готовой части idx в очередь декодирования и измерения"""
+        with self.lock:
+            self.prepared.append(self.pool.submit(self._prepare, idx, src))
+
+    def _prepare(self, idx: int, src: str):
+        dst = os.path.splitext(src)[0] + ".pcm.wav"
+        samples = decode_pcm(src, dst)
+        measured = measure_loudness(dst) if samples else {"input_i": "-inf"}
+        with self.lock:
+            self.ready[idx] = (dst, samples)
+            level = float(measured["input_i"])
+            if -99 <= level <= 0:
+                self.energy += samples * 10 ** (level / 10)
+                self.measured += samples
+                self.peak = max(self.peak, float(measured["input_tp"]))
+            self._advance()
+
+    def _gain(self) -> str:
+        """Фильтр усиления по текущей оценке громкости (под блокировкой)"""
+        if not self.measured:
+            return "anull"
+        level = 10 * math.log10(self.energy / self.measured)
+        return loudness_gain({"input_i": level, "input_tp": self.peak})
+
+    def _advance(self, missing: set = None, count: int = 0):
+        """
+        Укладка готовых частей на шкалу и постановка сегментов в кодирование
+        (под блокировкой). missing и count задаются в конце синтеза: чанки
+        без аудио пропускаются, а последний сегмент доходит до конца шкалы
+        """
+        while self.next_idx in self.ready or (missing and self.next_idx in missing):
+            if self.next_idx in self.ready:
+                path, samples = self.ready.pop(self.next_idx)
+                self.pcm.append((path, self.total, samples))
+                self.total += samples
+            self.next_idx += 1
+        final = count and self.next_idx >= count
+        lookahead = seam_overlap(self.grid) + sum(self.grid)
+        while self.start < self.total:
+            end = next_seam(self.start + self.length, self.grid)
+            if end + lookahead > self.total:
+                if not final:
+                    break
+                end = max(end, self.total)
+            dst = os.path.join(self.temp_dir, f"segment_{len(self.segments):05d}.enc{self.ext}")
+            future = self.pool.submit(
+                encode_span, list(self.pcm), self.start, end, self.grid, self._gain(), dst
+            )
+            future.add_done_callback(self._release)
+            first = self.start - seam_overlap(self.grid) if self.start else 0
+            self.segments.append((first, future))
+            self.start = min(end, self.total)
+
+    def _release(self, _future=None):
+        """Удаление WAV частей, не нужных ни одному незакодированному сегменту"""
+        with self.lock:
+            low = self.start - seam_overlap(self.grid)
+            for first, future in self.segments:
+                if not future.done():
+                    low = min(low, first)
+            while self.released < len(self.pcm):
+                path, begin, samples = self.pcm[self.released]
+                if begin + samples > low:
+                    break
+                if os.path.exists(path):
+                    os.remove(path)
+                self.released += 1
 
-    log(f"Достигнут максимум попыток для {output_file}", "ERROR")
-    return False
+    def finish(self, results: list) -> list:
+        """
+        Завершение после синтеза: results - пути частей по номерам чанков
+        (None - чанк без аудио). Дожидается подготовки частей, кодирует
+        оставшиеся сегменты и возвращает их список для join_segments
+        """
+        for future in list(self.prepared):
+            future.result()
+        with self.lock:
+            missing = {idx for idx, path in enumerate(results) if not path}
+            self._advance(missing, len(results))
+            segments = list(self.segments)
+        return [future.result() for _, future in segments]
 
+    def shutdown(self):
+        """Остановка пула и удаление WAV и сегментов кодировщика"""
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        paths = [path for path, _, _ in self.pcm[self.released :]]
+        paths += [path for path, _ in self.ready.values()]
+        for _, future in self.segments:
+            if future.done() and not future.cancelled() and not future.exception():
+                paths.append(future.result()[0])
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
 
-def ffmpeg_process():
+
+def write_concat_list(
+    files: list, temp_dir: str = None, name: str = "concat_list.txt"
+) -> str:
+    """Создание списка файлов для concat-демультиплексора FFmpeg"""
+    concat_list = os.path.join(temp_dir or CONFIG["temp_dir"], name)
+    return tts_common.write_concat_list(files, concat_list)
+
+
+def ffmpeg_process(concat_list: str, output: str = None):
     """
-    Обработка аудио через FFmpeg с контролем качества и формата
+    Объединение частей и обработка аудио одним вызовом FFmpeg
     Этапы:
-    1. Конвертация в конечный формат
-    2. Нормализация звука
-    3. Применение параметров качества
+    1. Чтение частей через concat-демультиплексор (без промежуточного файла)
+    2. Конвертация в конечный формат
+    3. Нормализация звука
+    4. Применение параметров качества
     """
     log("Инициализация обработки FFmpeg", "DEBUG")
 
@@ -179,25 +1590,22 @@ def ffmpeg_process():
             "-y" if CONFIG["overwrite"] else "-n",
             "-loglevel",
             "error",
+            "-f",
+            "concat",
+            "-safe",
+            "0",
             "-i",
-            CONFIG["temp_file"],
-            "-c:a",
-            CONFIG["codec"],
-            "-ar",
-            CONFIG["sample_rate"],
-            "-ac",
-            CONFIG["channels"],
-            "-b:a",
-            CONFIG["bitrate"],
+            concat_list,
+            *encode_args(),
             "-af",
-            "loudnorm=I=-16:LRA=11:TP=-1.5",  # Нормализация звука
+            f"loudnorm={LOUDNORM}",  # Нормализация звука
             "-hide_banner",
         ]
 
         if CONFIG["duration"] > 0:
             cmd.extend(["-t", str(CONFIG["duration"])])
 
-        cmd.append(CONFIG["output"])
+        cmd.append(output or CONFIG["output"])
 
         result = subprocess.run(cmd, check=True, capture_output=True, text=True)
 
@@ -208,12 +1616,677 @@ def ffmpeg_process():
         raise
 
 
+def ffmpeg_process_mp3(files: list, output: str = None):
+    """
+    Финализация MP3-частей без списка объединения
+    Аудиокадры частей подаются в FFmpeg через канал одним корректным потоком
+    """
+    pipe = FFmpegPipe("mp3", output)
+    try:
+        mp3_frames.concat_files(files, pipe, header=False)
+        pipe.close()
+    except BaseException:
+        pipe.abort()
+        raise
+
+
+def parallel_finalize(files: list, output: str = None, temp_dir: str = None):
+    """
+    Финализация сегментами параллельно в ENCODE_WORKERS процессов FFmpeg
+    1. Части декодируются в WAV на общую шкалу отсчетов (decode_pcm)
+    2. Громкость измеряется один раз по всем частям (первый проход
+       loudnorm) - усиление везде одинаковое, как у обработки всего файла
+    3. Шкала делится на сегменты по числу процессов с границами на сетке
+       кадров кодека (seam_grid), каждый кодируется с перекрытием
+    4. Сегменты склеиваются без перекодирования и без швов (join_segments)
+    Временным файлам нужно место под несжатое аудио всех частей.
+    """
+    output = output or CONFIG["output"]
+    temp_dir = temp_dir or CONFIG["temp_dir"]
+    ext = os.path.splitext(output)[1]
+    grid = seam_grid(output)
+    workers = CONFIG["encode_workers"]
+    pcm_files = [os.path.join(temp_dir, f"pcm_{idx:05d}.wav") for idx in range(len(files))]
+    segments = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encode") as pool:
+            with timed("decode"):
+                lengths = list(pool.map(decode_pcm, files, pcm_files))
+            pcm = []
+            total = 0
+            for path, samples in zip(pcm_files, lengths):
+                pcm.append((path, total, samples))
+                total += samples
+
+            concat_list = write_concat_list(pcm_files, temp_dir)
+            try:
+                with timed("loudness"):
+                    measured = measure_loudness(concat_list, concat=True)
+            finally:
+                os.remove(concat_list)
+            audio_filter = loudness_gain(measured)
+
+            bounds = [0]
+            for number in range(1, workers):
+                seam = next_seam(total * number // workers, grid)
+                if bounds[-1] < seam < total:
+                    bounds.append(seam)
+            bounds.append(total)
+            log(f"Громкость: {measured['input_i']} LUFS, сегментов: {len(bounds) - 1}", "INFO")
+
+            with timed("encode_segments"):
+                futures = [
+                    pool.submit(
+                        encode_span,
+                        pcm,
+                        start,
+                        end,
+                        grid,
+                        audio_filter,
+                        os.path.join(temp_dir, f"segment_{number:03d}.enc{ext}"),
+                    )
+                    for number, (start, end) in enumerate(zip(bounds, bounds[1:]))
+                ]
+                segments = [future.result() for future in futures]
+
+        with timed("concat"):
+            join_segments(segments, total, output)
+    finally:
+        for path in pcm_files + [segment[0] for segment in segments]:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def finalize_parts(files: list, output: str = None, temp_dir: str = None):
+    """Сборка итогового файла output из частей в порядке files"""
+    mp3_parts = os.path.splitext(files[0])[1].lower() == ".mp3"
+    if CONFIG["parallel_finalize"] and len(files) > 1:
+        if seam_grid(output):
+            log("Финализация сегментами параллельно...", "INFO")
+            parallel_finalize(files, output, temp_dir)
+            return
+        log(
+            f"PARALLEL_FINALIZE не поддерживает {CONFIG['codec']} в "
+            f"{output or CONFIG['output']}: кодирование одним проходом",
+            "WARN",
+        )
+    if mp3_parts:
+        # Части подаются в FFmpeg одним потоком кадров через канал
+        log("Объединение и финализация аудиофайла...", "INFO")
+        with timed("concat_encode"):
+            ffmpeg_process_mp3(files, output)
+        return
+
+    # Создание списка для объединения
+    concat_list = write_concat_list(files, temp_dir)
+    log(f"Создан список объединения: {concat_list}", "DEBUG")
+    try:
+        # Объединение и финализация аудио одним процессом FFmpeg
+        log("Объединение и финализация аудиофайла...", "INFO")
+        with timed("concat_encode"):
+            ffmpeg_process(concat_list, output)
+    finally:
+        os.remove(concat_list)
+
+
+def log_dedup_stats():
+    """Отчет об экономии от однократного синтеза повторов"""
+    log(
+        f"Повторы: сэкономлено запросов {STATS['dedup_hits']}, "
+        f"времени запросов {STATS['dedup_seconds']:.1f} сек",
+        "INFO",
+    )
+
+
+def create_limiter(engine: TTSEngine) -> TokenBucket:
+    """Общий ограничитель частоты запросов по настройкам RATE_*"""
+    # gTTS отправляет запрос на каждые ~100 символов чанка
+    rate = CONFIG["rate_limit"] or (
+        CONFIG["chunk_size"] / 100 / CONFIG["delay_between_chunks"]
+    )
+    if CONFIG["adaptive_rate"]:
+        return AdaptiveRateLimiter(
+            rate,
+            CONFIG["rate_burst"],
+            min_rate=CONFIG["rate_min"],
+            max_rate=CONFIG["rate_max"],
+            increase=CONFIG["rate_increase"],
+            decrease=CONFIG["rate_decrease"],
+            state_file=CONFIG["rate_state_file"],
+            state_key=f"{engine.name} {CONFIG['gtts_base_url']}".strip(),
+        )
+    return TokenBucket(rate, CONFIG["rate_burst"])
+
+
+class FFmpegPipe:
+    """
+    Финализация аудио одним процессом FFmpeg, читающим части из stdin
+    Части приходят из синтеза в произвольном порядке; put() держит их
+    в буфере переупорядочивания и пишет в канал, как только готова
+    следующая по порядку. Неудачный чанк передается как None и пропускается.
+    Ни частей, ни списка объединения на диске не создается.
+    """
+
+    def __init__(self, input_format: str, output: str = None):
+        self.output = output or CONFIG["output"]
+        cmd = [
+            "ffmpeg",
+            "-y" if CONFIG["overwrite"] else "-n",
+            "-loglevel",
+            "error",
+            "-f",
+            input_format,
+            "-i",
+            "pipe:0",
+            *encode_args(),
+            "-af",
+            f"loudnorm={LOUDNORM}",
+            "-hide_banner",
+        ]
+        if CONFIG["duration"] > 0:
+            cmd.extend(["-t", str(CONFIG["duration"])])
+        cmd.append(self.output)
+
+        # stderr во временный файл: канал мог бы заполниться и заблокировать FFmpeg
+        self.stderr = tempfile.TemporaryFile()
+        self.existed = os.path.exists(self.output)
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self.stderr)
+        self.input_format = input_format
+        self.window = {}  # Номер чанка -> аудио, ожидающее предыдущих
+        self.next = 0  # Номер следующего чанка для записи в канал
+        self.closed = False  # FFmpeg перестал читать (например, достигнут -t)
+
+    def write(self, data) -> int:
+        """Запись в канал FFmpeg (после его остановки данные отбрасываются)"""
+        if not self.closed:
+            try:
+                self.process.stdin.write(data)
+            except BrokenPipeError:
+                self.closed = True
+        return len(data)
+
+    def put(self, idx: int, audio: bytes):
+        """Передача готовой части (None - чанк пропущен)"""
+        self.window[idx] = audio
+        while self.next in self.window:
+            audio = self.window.pop(self.next)
+            self.next += 1
+            if not audio:
+                continue
+            if self.input_format == "mp3":
+                # Теги и кадры Xing частей внутри потока FFmpeg воспринял бы
+                # как аудио: пишутся только аудиокадры
+                view = memoryview(audio)
+                for start, end, _, _ in mp3_frames.scan(audio)[0]:
+                    self.write(view[start:end])
+            else:
+                self.write(audio)
+
+    def close(self):
+        """Завершение ввода и ожидание FFmpeg"""
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self.process.wait()
+        self.stderr.seek(0)
+        stderr = self.stderr.read().decode("utf-8", "replace")
+        self.stderr.close()
+        if returncode:
+            log(f"Ошибка FFmpeg (код {returncode}): {stderr}", "ERROR")
+            raise subprocess.CalledProcessError(returncode, self.process.args, stderr=stderr)
+        log(f"FFmpeg завершен с кодом {returncode}", "DEBUG")
+
+    def abort(self):
+        """Аварийная остановка FFmpeg (незавершенный файл не сохраняется)"""
+        self.process.kill()
+        self.process.wait()
+        self.stderr.close()
+        # Существующий файл без OVERWRITE_OUTPUT FFmpeg не трогал
+        if os.path.exists(self.output) and (CONFIG["overwrite"] or not self.existed):
+            os.remove(self.output)
+
+
+class SegmentWriter:
+    """
+    Прогрессивный вывод частей сегментами с плейлистом HLS
+    Части приходят в произвольном порядке; как и в FFmpegPipe, put() держит
+    их в буфере переупорядочивания и по порядку пишет в directory сегменты
+    seg_NNNNN.mp3 (только аудиокадры, без тегов) и обновляет index.m3u8.
+    Часть длиннее SEGMENT_SECONDS делится на сегменты по границам кадров,
+    поэтому EXT-X-TARGETDURATION постоянен (RFC 8216 запрещает его менять).
+    Плейлист типа EVENT можно открыть в плеере сразу после первого
+    сегмента: до конца синтеза он дополняется, close() завершает его
+    тегом EXT-X-ENDLIST. Сегменты - аудио движка без нормализации
+    громкости; итоговый файл OUTPUT_FILE собирается как обычно.
+    """
+
+    PLAYLIST = "index.m3u8"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):  # Сегменты прошлого запуска
+            if name.startswith("seg_") or name == self.PLAYLIST:
+                os.remove(os.path.join(directory, name))
+        self.window = {}  # Номер чанка -> часть, ожидающая предыдущих
+        self.next = 0
+        self.segments = []  # (имя файла, длительность сек)
+        self.started = time.monotonic()
+        self.first_audio = None  # Время до первого сегмента (сек)
+        self.write_playlist()
+
+    def put(self, idx: int, audio):
+        """Готовая часть: путь к файлу или аудио в памяти (None - пропуск)"""
+        self.window[idx] = audio
+        while self.next in self.window:
+            audio = self.window.pop(self.next)
+            self.next += 1
+            if audio:
+                self.write_segment(audio)
+
+    def write_segment(self, audio):
+        """Аудиокадры части - в один или несколько сегментов до SEGMENT_SECONDS"""
+        if isinstance(audio, str):
+            with open(audio, "rb") as f:
+                audio = f.read()
+        spans, first, _ = mp3_frames.scan(audio)
+        if first is None:
+            return
+        sample_rate = mp3_frames.parse_header(first).sample_rate
+        limit = CONFIG["segment_seconds"] * sample_rate  # Отсчетов в сегменте
+        view = memoryview(audio)
+        frames = []
+        samples = 0
+        for start, end, _, _ in spans:
+            pos = start
+            while pos < end:
+                header = mp3_frames.parse_header(bytes(audio[pos : pos + 4]))
+                if frames and samples + header.samples > limit:
+                    self.write_frames(frames, samples / sample_rate)
+                    frames = []
+                    samples = 0
+                frames.append(view[pos : pos + header.length])
+                samples += header.samples
+                pos += header.length
+        if frames:
+            self.write_frames(frames, samples / sample_rate)
+
+    def write_frames(self, frames: list, seconds: float):
+        name = f"seg_{len(self.segments) + 1:05d}.mp3"
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            f.writelines(frames)
+        os.replace(path + ".tmp", path)
+        self.segments.append((name, seconds))
+        self.write_playlist()
+        if self.first_audio is None:
+            self.first_audio = time.monotonic() - self.started
+            log(f"Первый сегмент готов через {self.first_audio:.1f} сек: {path}", "INFO")
+
+    def write_playlist(self, finished: bool = False):
+        """Атомарная перезапись плейлиста (плеер не увидит его наполовину)"""
+        target = math.ceil(CONFIG["segment_seconds"])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for name, seconds in self.segments:
+            lines += [f"#EXTINF:{seconds:.3f},", name]
+        if finished:
+            lines.append("#EXT-X-ENDLIST")
+        write_atomic(os.path.join(self.directory, self.PLAYLIST), "\n".join(lines) + "\n")
+
+    def close(self):
+        self.write_playlist(finished=True)
+        log(f"Сегментов: {len(self.segments)}, плейлист: {os.path.join(self.directory, self.PLAYLIST)}", "INFO")
+
+
+def audio_duration(audio) -> float:
+    """Длительность части: путь к файлу MP3/WAV или MP3 в памяти (сек)"""
+    if not isinstance(audio, str):
+        return mp3_frames.data_duration(audio)
+    if audio.lower().endswith(".wav"):
+        with wave.open(audio, "rb") as f:
+            return f.getnframes() / f.getframerate()
+    return mp3_frames.duration(audio)
+
+
+class AudioIndex:
+    """
+    Индекс "позиция в тексте -> время в итоговом файле"
+    spans - положение каждого чанка в исходном тексте (split_text/iter_chunks),
+    chapters - заголовки глав (find_chapters). Длительность части
+    записывается при ее готовности (record) по аудиокадрам, без
+    декодирования. write() сохраняет индекс в JSON с параллельными
+    массивами по чанкам (начало и конец в тексте, время начала,
+    длительность) - переход к позиции текста бинарным поиском (seek_time).
+    Точность - до кадра MP3 (~25 мс) на каждый чанк.
+    """
+
+    VERSION = 1
+
+    def __init__(self):
+        self.spans = []  # (начало, конец) чанка в тексте, в символах
+        self.chapters = []  # (позиция, заголовок)
+        self.durations = {}  # Номер чанка -> длительность части (сек)
+
+    def record(self, idx: int, audio):
+        """Длительность готовой части: путь к файлу или аудио в памяти"""
+        try:
+            self.durations[idx] = audio_duration(audio)
+        except (OSError, EOFError, wave.Error) as e:
+            log(f"Не удалось определить длительность части {idx + 1}: {str(e)}", "WARN")
+
+    def build(self, limit: float = 0) -> dict:
+        """Данные индекса; limit > 0 - результат обрезан до limit сек"""
+        index = {
+            "version": self.VERSION,
+            "output": os.path.basename(CONFIG["output"]),
+            "char_start": [],
+            "char_end": [],
+            "time": [],
+            "seconds": [],
+            "missing": [],  # Номера чанков без аудио
+        }
+        position = 0.0
+        for idx, (start, end) in enumerate(self.spans):
+            if limit and position >= limit:
+                break
+            seconds = self.durations.get(idx)
+            if seconds is None:
+                index["missing"].append(idx)
+                seconds = 0.0
+            if limit:
+                seconds = min(seconds, limit - position)
+            index["char_start"].append(start)
+            index["char_end"].append(end)
+            index["time"].append(round(position, 3))
+            index["seconds"].append(round(seconds, 3))
+            position += seconds
+        index["duration"] = round(position, 3)
+        index["chapters"] = [
+            {"offset": offset, "title": title, "time": round(seek_time(index, offset), 3)}
+            for offset, title in self.chapters
+            if not index["char_end"] or offset < index["char_end"][-1]
+        ]
+        return index
+
+    def write(self, path: str, limit: float = 0):
+        index = self.build(limit)
+        write_atomic(path, json.dumps(index, ensure_ascii=False, separators=(",", ":")))
+        log(
+            f"Индекс: {len(index['time'])} чанков, {len(index['chapters'])} глав -> {path}",
+            "INFO",
+        )
+
+
+def seek_time(index: dict, offset: int) -> float:
+    """
+    Время в итоговом файле для позиции offset исходного текста (сек)
+    Чанк находится бинарным поиском, внутри чанка время пропорционально
+    позиции; позиция между чанками соответствует началу следующего.
+    """
+    i = bisect.bisect_right(index["char_start"], offset) - 1
+    if i < 0:
+        return 0.0
+    start, end = index["char_start"][i], index["char_end"][i]
+    fraction = min(1.0, (offset - start) / max(1, end - start))
+    return index["time"][i] + index["seconds"][i] * fraction
+
+
+class DeferredChunks:
+    """
+    Очередь отложенных повторов неудачных чанков
+    Чанк повторяется не более rounds раз, n-й повтор - не раньше чем через
+    delay*BACKOFF_FACTOR^(n-1) сек после неудачи. Пока чанк ждет, потоки
+    синтезируют следующие.
+    """
+
+    def __init__(self, rounds: int, delay: float):
+        self.rounds = rounds
+        self.delay = delay
+        self.heap = []  # (время повтора, номер чанка, текст)
+        self.attempts = {}  # Номер чанка -> отложенных повторов
+
+    def __len__(self):
+        return len(self.heap)
+
+    def defer(self, idx: int, chunk: str):
+        """Постановка чанка в очередь, None - бюджет повторов исчерпан"""
+        attempt = self.attempts.get(idx, 0)
+        if attempt >= self.rounds:
+            return None
+        self.attempts[idx] = attempt + 1
+        delay = self.delay * CONFIG["backoff_factor"] ** attempt
+        heapq.heappush(self.heap, (time.monotonic() + delay, idx, chunk))
+        count("deferred")
+        return delay
+
+    def wait_time(self):
+        """Секунд до ближайшего повтора (None - очередь пуста)"""
+        if not self.heap:
+            return None
+        return max(0.0, self.heap[0][0] - time.monotonic())
+
+    def pop_ready(self):
+        """Чанк, время повтора которого наступило: (номер, текст) или None"""
+        if self.heap and self.heap[0][0] <= time.monotonic():
+            _, idx, chunk = heapq.heappop(self.heap)
+            return idx, chunk
+        return None
+
+
+def write_missing(path: str, missing: dict, total: int):
+    """
+    Список несинтезированных чанков в JSON (для повторного запуска или
+    ручной обработки); пустой missing удаляет список прошлого запуска
+    """
+    if not missing:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    data = {
+        "output": os.path.abspath(CONFIG["output"]),
+        "chunks_total": total,
+        "missing": [
+            {"index": idx, "chars": len(chunk), "text": chunk}
+            for idx, chunk in sorted(missing.items())
+        ],
+    }
+    write_atomic(path, json.dumps(data, ensure_ascii=False, indent=2))
+    log(f"Несинтезированные чанки ({len(missing)}): {os.path.abspath(path)}", "WARN")
+
+
+def synthesize_chunks(
+    engine: TTSEngine,
+    chunks,
+    total: int,
+    manifest: JobManifest,
+    limiter: TokenBucket,
+    cache: ChunkCache = None,
+    on_ready=None,
+    in_memory: bool = False,
+    dedup: SegmentDedup = None,
+    missing: dict = None,
+) -> list:
+    """
+    Синтез всех чанков пулом из WORKERS потоков
+    Запросы к движку внутри чанков выполняет общий пул из REQUEST_WORKERS
+    потоков - это и есть предел одновременных запросов к сервису.
+    chunks - список или ленивый итератор (потоковый режим, total=None).
+    Одновременно в работе не более 2*WORKERS чанков, поэтому память
+    не растет с размером текста. on_ready(idx, path) вызывается для каждого
+    завершенного чанка (path=None - неудача), в том числе восстановленного
+    по манифесту (manifest=None - без манифеста).
+    in_memory: части не пишутся на диск, on_ready получает аудио в памяти.
+    dedup - общий для всех чанков повтор уже синтезированных фрагментов.
+    Неудачный чанк уходит в очередь отложенных повторов (DEFERRED_RETRIES)
+    и не задерживает остальные; on_ready для него вызывается после
+    успешного повтора или исчерпания бюджета. Тексты окончательно
+    неудачных чанков записываются в missing (номер -> текст).
+    Чанк не запускается, пока он дальше REORDER_WINDOW от самого раннего
+    незавершенного: так ограничен объем готовых частей, ждущих предыдущих.
+    Возвращает пути к частям в исходном порядке (None - неудача,
+    True - часть в памяти передана on_ready)
+    """
+    results = []
+    pending = {}
+    texts = {}  # Номер чанка в работе -> текст (для отложенного повтора)
+    max_pending = CONFIG["workers"] * 2
+    window = CONFIG["reorder_window"] or CONFIG["workers"] * 4
+    success_count = 0
+    deferred = None
+    if CONFIG["deferred_retries"]:
+        deferred = DeferredChunks(CONFIG["deferred_retries"], CONFIG["deferred_delay"])
+
+    def submit(idx, chunk):
+        future = pool.submit(
+            process_chunk,
+            engine,
+            idx,
+            chunk,
+            total,
+            limiter,
+            cache,
+            request_pool,
+            in_memory,
+            dedup=dedup,
+            defer=deferred is not None,
+        )
+        pending[future] = idx
+        texts[idx] = chunk
+
+    def earliest():
+        """
+        Самый ранний незавершенный чанк (None - нет таких)
+        Отложенные учитываются только для частей в памяти: их ждет буфер
+        переупорядочивания, а части на диске память не занимают
+        """
+        waiting = [entry[1] for entry in deferred.heap] if deferred and in_memory else []
+        return min([*pending.values(), *waiting], default=None)
+
+    def collect(done):
+        """Обработка завершенных задач синтеза"""
+        nonlocal success_count
+        for future in done:
+            idx = pending.pop(future)
+            chunk = texts.pop(idx)
+            try:
+                part_file = future.result()
+                permanent = False
+            except PermanentTTSError:
+                part_file = None
+                permanent = True  # Не откладывается: повтор не поможет
+            if not part_file and deferred is not None and not permanent:
+                delay = deferred.defer(idx, chunk)
+                if delay is not None:
+                    if manifest:
+                        manifest.mark(idx, "deferred")
+                    log(f"Чанк {idx + 1} отложен, повтор через {delay:.0f} сек", "WARN")
+                    continue
+            if on_ready:
+                on_ready(idx, part_file)
+            if part_file:
+                # Аудио в памяти уже передано on_ready и не удерживается
+                results[idx] = True if in_memory else part_file
+                success_count += 1
+                if manifest:
+                    manifest.mark(idx, "done", part_file)
+
+                # Прогресс обработки
+                if total:
+                    progress = success_count / total * 100
+                    log(
+                        "Прогресс: %.1f%% | Обработано: %d/%d",
+                        "INFO",
+                        progress,
+                        success_count,
+                        total,
+                    )
+                else:
+                    log("Обработано: %d", "INFO", success_count)
+            else:
+                if manifest:
+                    manifest.mark(idx, "failed")
+                if missing is not None:
+                    missing[idx] = chunk
+                log(f"Пропуск чанка {idx + 1} из-за ошибок генерации", "WARN")
+
+    def step():
+        """Ожидание завершения чанка или времени отложенного повтора"""
+        timeout = None
+        if deferred and len(pending) < max_pending:
+            # При заполненном пуле повтор все равно ждет свободного места
+            timeout = deferred.wait_time()
+        if pending:
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            collect(done)
+        else:
+            time.sleep(timeout)  # В работе нет чанков, только отложенные
+        while deferred and len(pending) < max_pending:
+            ready = deferred.pop_ready()
+            if ready is None:
+                break
+            log(f"Повтор отложенного чанка {ready[0] + 1}", "INFO")
+            submit(*ready)
+
+    request_workers = CONFIG["request_workers"] or CONFIG["workers"]
+    # Пул чанков завершается первым: его задачи используют пул запросов
+    with ThreadPoolExecutor(
+        max_workers=request_workers, thread_name_prefix="tts_request"
+    ) as request_pool, ThreadPoolExecutor(max_workers=CONFIG["workers"]) as pool:
+        try:
+            for idx, chunk in enumerate(chunks):
+                ready = manifest.add(chunk) if manifest else None
+                results.append(ready)
+                if ready:
+                    success_count += 1
+                    if on_ready:
+                        on_ready(idx, ready)
+                    log("[%d/%s] Чанк готов по манифесту", "DEBUG", idx + 1, total or "?")
+                    continue
+
+                while len(pending) >= max_pending or (
+                    earliest() is not None and idx - earliest() >= window
+                ):
+                    step()
+                submit(idx, chunk)
+
+            total = len(results)
+            if manifest:
+                manifest.save(finished=True)
+            log(f"План разбиения: {total} частей", "DEBUG")
+            while pending or deferred:
+                step()
+        except BaseException:
+            # Прерывание (Ctrl-C, ошибка): не запускаем оставшиеся чанки
+            for future in pending:
+                future.cancel()
+            if manifest:
+                manifest.save()
+            raise
+
+    return results
+
+
 def main():
     """Основной процесс конвертации"""
     start_time = datetime.now()
     temp_files = []
     success_count = 0
-    concat_list = None
+    total = 0
+    manifest = None
+    created_temp = False  # TEMP_DIR создан этим запуском
+    encoder = None
+    limiter = None
+    pipe = None
+    segments = None
+    completed = False
+    missing = {}  # Номер несинтезированного чанка -> текст
 
     try:
         log("=" * 60)
@@ -229,93 +2302,201 @@ def main():
         if os.path.getsize(CONFIG["input"]) == 0:
             raise ValueError("Входной файл пуст")
 
-        # Чтение текста
-        with open(CONFIG["input"], "r", encoding="utf-8") as f:
-            text = f.read().strip()
+        # Чтение и разбиение текста
+        index = AudioIndex() if CONFIG["index"] else None
+        if CONFIG["stream_input"]:
+            # Потоковый режим: чанки выдаются лениво, синтез начинается сразу
+            blocks = iter_text_blocks(CONFIG["input"])
+            if index:
+                blocks = iter_chapter_blocks(blocks, index.chapters)
+            chunks = iter_chunks(
+                blocks, CONFIG["chunk_size"], index.spans if index else None
+            )
+            total = None
+            log("Потоковое чтение входного файла", "INFO")
+        else:
+            with timed("read"), open(CONFIG["input"], "r", encoding="utf-8") as f:
+                text = f.read()
+            lead = len(text) - len(text.lstrip())  # Позиции индекса - в исходном тексте
+            text = text.strip()
+            log(f"Прочитано {len(text):,} символов", "INFO")
 
-        log(f"Прочитано {len(text):,} символов", "INFO")
+            with timed("split"):
+                spans = [] if index else None
+                chunks = split_text(text, CONFIG["chunk_size"], spans)
+                if index:
+                    index.spans = [(start + lead, end + lead) for start, end in spans]
+                    index.chapters = find_chapters(text, lead)
+            del text
+            total = len(chunks)
+            log(f"Получено {total} частей для обработки", "INFO")
 
-        # Подготовка временного хранилища
-        os.makedirs(CONFIG["temp_dir"], exist_ok=True)
-        log(f"Временная директория: {os.path.abspath(CONFIG['temp_dir'])}", "DEBUG")
+        engine = create_engine()
+        log(f"Движок синтеза: {engine.name}", "INFO")
 
-        # Разбиение текста
-        chunks = split_text(text, CONFIG["chunk_size"])
-        log(f"Получено {len(chunks)} частей для обработки", "INFO")
+        if CONFIG["segment_dir"] and engine.audio_format != "mp3":
+            log(f"SEGMENT_DIR не поддерживается для {engine.audio_format}, сегменты не пишутся", "WARN")
+        elif CONFIG["segment_dir"]:
+            segments = SegmentWriter(CONFIG["segment_dir"])
+            log(f"Прогрессивный вывод: {os.path.abspath(segments.directory)}", "INFO")
 
-        # Обработка чанков
-        for idx, chunk in enumerate(chunks):
-            chunk_hash = hashlib.md5(chunk.encode()).hexdigest()[:8]
-            temp_file = os.path.join(
-                CONFIG["temp_dir"], f"part_{idx + 1:04d}_{chunk_hash}.mp3"
-            )
+        in_memory = CONFIG["in_memory"]
+        if in_memory and engine.audio_format != "mp3":
+            # Поток из склеенных частей FFmpeg читает только для MP3
+            log(f"IN_MEMORY не поддерживается для {engine.audio_format}, части пишутся на диск", "WARN")
+            in_memory = False
 
-            log(f"[{idx + 1}/{len(chunks)}] Обработка чанка {temp_file}", "INFO")
-            log(
-                f"Содержимое чанка (первые 50 символов): {chunk[:50].replace('\n', ' ')}...",
-                "DEBUG",
-            )
+        if in_memory:
+            log("Части в памяти, вывод сразу в FFmpeg (без манифеста)", "INFO")
+        else:
+            # Подготовка временного хранилища
+            created_temp = not os.path.isdir(CONFIG["temp_dir"])
+            os.makedirs(CONFIG["temp_dir"], exist_ok=True)
+            log(f"Временная директория: {os.path.abspath(CONFIG['temp_dir'])}", "DEBUG")
 
-            if generate_tts(chunk, temp_file):
-                temp_files.append(temp_file)
-                success_count += 1
+            # Манифест задачи для возобновления после сбоя
+            fingerprint = {
+                "input_sha256": file_sha256(CONFIG["input"]),
+                "chunk_size": CONFIG["chunk_size"],
+                "language": CONFIG["language"],
+                # Части другого движка или голоса не смешиваются с новыми
+                "engine": engine.name,
+                "engine_options": engine.options(),
+            }
+            manifest = JobManifest(CONFIG["output"] + ".job.json", fingerprint)
+            if CONFIG["resume"] and manifest.restore():
+                log("Возобновление задачи по манифесту", "INFO")
+            log(f"Манифест задачи: {os.path.abspath(manifest.path)}", "DEBUG")
 
-                # Прогресс обработки
-                progress = (idx + 1) / len(chunks) * 100
+        # Обработка чанков пулом потоков с общим ограничителем частоты
+        limiter = create_limiter(engine)
+        log(
+            f"Потоков: {CONFIG['workers']}, "
+            f"запросов: {CONFIG['request_workers'] or CONFIG['workers']}, лимит: {limiter.rate:.3f} запросов/сек"
+            + (" (автоподстройка)" if CONFIG["adaptive_rate"] else ""),
+            "INFO",
+        )
+
+        cache = None
+        if CONFIG["cache_dir"]:
+            cache = ChunkCache(CONFIG["cache_dir"], CONFIG["cache_max_size_mb"] * 2**20)
+            log(f"Кэш чанков: {os.path.abspath(CONFIG['cache_dir'])}", "DEBUG")
+        render = None
+        if CONFIG["render_dir"]:
+            render = RenderStore(CONFIG["render_dir"], cache)
+            log(f"Части рендера: {os.path.abspath(CONFIG['render_dir'])}", "INFO")
+
+        dedup = None
+        if CONFIG["dedup"]:
+            dedup = SegmentDedup(engine, CONFIG["dedup_max_size_mb"] * 2**20)
+
+        if in_memory:
+            # Финализация идет параллельно с синтезом в одном процессе FFmpeg
+            pipe = FFmpegPipe(engine.audio_format)
+        elif CONFIG["incremental_encode"]:
+            grid = seam_grid()
+            if grid:
+                encoder = ChunkEncoder(CONFIG["encode_workers"], grid)
+                log(f"Фоновое кодирование: {CONFIG['encode_workers']} потоков", "INFO")
+            else:
                 log(
-                    f"Прогресс: {progress:.1f}% | Обработано: {success_count}/{len(chunks)}",
-                    "INFO",
+                    f"Фоновое кодирование не поддерживает {CONFIG['codec']} в "
+                    f"{CONFIG['output']}: файл будет собран после синтеза",
+                    "WARN",
                 )
 
-                # Задержка между запросами
-                if idx < len(chunks) - 1:
-                    delay = CONFIG["delay_between_chunks"]
-                    log(f"Пауза {delay} сек перед следующим запросом...", "DEBUG")
-                    time.sleep(delay)
-            else:
-                log(f"Пропуск чанка {idx + 1} из-за ошибок генерации", "WARN")
+        def on_ready(idx, part_file):
+            if index and part_file:
+                index.record(idx, part_file)
+            if segments:
+                segments.put(idx, part_file)
+            if pipe:
+                pipe.put(idx, part_file)
+            elif encoder and part_file:
+                encoder.submit(idx, part_file)
+
+        # В потоковом режиме сюда входят чтение и разбиение текста
+        # (при ошибке фоновое кодирование останавливает encoder.shutdown())
+        with timed("synthesis"):
+            results = synthesize_chunks(
+                engine,
+                chunks,
+                total,
+                manifest,
+                limiter,
+                render or cache,
+                on_ready,
+                in_memory,
+                dedup,
+                missing,
+            )
+        total = len(results)
+        success_count = sum(1 for path in results if path)
+
+        # Сборка в исходном порядке чанков
+        temp_files = [path for path in results if path]
+        if cache:
+            log(f"Кэш: попаданий {cache.hits}, промахов {cache.misses}", "INFO")
+        if render:
+            log(
+                f"Рендер: из прошлого {render.hits} чанков, из кэша {render.cached}, "
+                f"новых {render.misses}",
+                "INFO",
+            )
+        if dedup:
+            log_dedup_stats()
+        connections = engine.connection_stats()
+        if connections:
+            log(
+                f"HTTP: запросов {connections['requests']}, "
+                f"соединений {connections['connections']}, "
+                f"по keep-alive {connections['reused']}",
+                "INFO",
+            )
+
+        write_missing(
+            CONFIG["missing_file"] or CONFIG["output"] + ".missing.json", missing, total
+        )
 
         # Проверка успешных генераций
         if success_count == 0:
             raise RuntimeError("Не удалось сгенерировать ни одного аудиофрагмента")
+        if missing and CONFIG["require_complete"]:
+            raise RuntimeError(
+                f"Не синтезировано чанков: {len(missing)}, итоговый файл не собран"
+            )
 
-        # Создание списка для объединения
-        concat_list = os.path.join(CONFIG["temp_dir"], "concat_list.txt")
-        with open(concat_list, "w", encoding="utf-8") as f:
-            for file in temp_files:
-                f.write(f"file '{os.path.abspath(file)}'\n")
-
-        log(f"Создан список объединения: {concat_list}", "DEBUG")
+        if segments:
+            segments.close()
+        if pipe:
+            log("Завершение финализации аудиофайла...", "INFO")
+            with timed("finalize"):
+                pipe.close()
+            completed = True
+        elif encoder:
+            # Дожидаемся кодирования последних сегментов
+            log("Ожидание фонового кодирования...", "INFO")
+            with timed("encode_wait"):
+                encoded = encoder.finish(results)
+            log("Склейка закодированных сегментов...", "INFO")
+            with timed("finalize"):
+                join_segments(encoded, encoder.total)
+            completed = True
+        else:
+            with timed("finalize"):
+                finalize_parts(temp_files)
+            completed = True
 
-        # Объединение аудиофайлов
-        log("Объединение аудиофрагментов...", "INFO")
-        try:
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-y",
-                    "-f",
-                    "concat",
-                    "-safe",
-                    "0",
-                    "-i",
-                    concat_list,
-                    "-c",
-                    "copy",
-                    "-loglevel",
-                    "error",
-                    CONFIG["temp_file"],
-                ],
-                check=True,
-                capture_output=True,
+        if index:
+            index.write(
+                CONFIG["index_file"] or CONFIG["output"] + ".index.json", CONFIG["duration"]
+            )
+        if render:
+            render.prune(
+                output=os.path.abspath(CONFIG["output"]),
+                chunking=CONFIG["chunking"],
+                chunk_size=CONFIG["chunk_size"],
             )
-        except subprocess.CalledProcessError as e:
-            log(f"Ошибка объединения: {e.stderr.decode()}", "ERROR")
-            raise
-
-        # Финализация аудио
-        log("Финализация аудиофайла...", "INFO")
-        ffmpeg_process()
 
         # Успешное завершение
         log("=" * 60)
@@ -323,7 +2504,7 @@ def main():
         log(f"Общее время: {datetime.now() - start_time}")
         log(f"Итоговый файл: {os.path.abspath(CONFIG['output'])}")
         log(
-            f"Эффективность: {success_count}/{len(chunks)} чанков ({success_count / len(chunks) * 100:.1f}%)"
+            f"Эффективность: {success_count}/{total} чанков ({success_count / total * 100:.1f}%)"
         )
         log("=" * 60)
 
@@ -348,11 +2529,55 @@ def main():
             except Exception as e:
                 log(f"Ошибка очистки {path}: {str(e)}", "WARN")
 
+        if encoder:
+            encoder.shutdown()
+        if pipe and not completed:
+            pipe.abort()
+
+        if isinstance(limiter, AdaptiveRateLimiter):
+            # Найденная частота - стартовая точка следующего запуска
+            log(f"Автоподстройка: {limiter.summary()}", "INFO")
+            try:
+                limiter.save()
+            except OSError as e:
+                log(f"Не удалось сохранить частоту запросов: {str(e)}", "WARN")
+
+        output_bytes = 0
+        if completed and os.path.exists(CONFIG["output"]):
+            output_bytes = os.path.getsize(CONFIG["output"])
+        gauges = {
+            "success": int(completed),
+            "chunks": total or 0,
+            "chunks_ok": success_count,
+            "chunks_missing": len(missing),
+            "output_bytes": output_bytes,
+            "duration_seconds": (datetime.now() - start_time).total_seconds(),
+        }
+        if segments and segments.first_audio is not None:
+            gauges["first_audio_seconds"] = segments.first_audio  # Время до первого звука
+        if isinstance(limiter, AdaptiveRateLimiter):
+            gauges["request_rate"] = limiter.rate  # Найденная частота (запросов/сек)
+        write_metrics(**gauges)
+
         log("Очистка временных ресурсов...", "INFO")
-        safe_remove(CONFIG["temp_dir"])
-        safe_remove(CONFIG["temp_file"])
-        if concat_list:
-            safe_remove(concat_list)
+        if pipe:
+            pass  # Временных файлов нет; TEMP_DIR прошлых запусков не трогаем
+        elif completed:
+            safe_remove(CONFIG["temp_dir"])
+            if manifest:
+                safe_remove(manifest.path)
+        elif manifest is None:
+            # Сбой до создания манифеста: части прошлых запусков в TEMP_DIR
+            # нужны для --resume, удаляется только созданная сейчас директория
+            if created_temp:
+                safe_remove(CONFIG["temp_dir"])
+        else:
+            # Готовые части и манифест сохраняются для продолжения задачи
+            log(
+                f"Готовые части сохранены, для продолжения запустите с --resume "
+                f"(манифест: {manifest.path})",
+                "WARN",
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,266 @@
+"""
+Демон конвертации: долгоживущий процесс с локальным HTTP API заданий
+Движок TTS, пул keep-alive соединений, ограничитель частоты, кэш чанков
+и повтор фрагментов создаются один раз при запуске и переиспользуются
+всеми заданиями (BatchRunner из audio_from_text_generator_batch.py),
+поэтому маленькие задания не платят за запуск Python, импорт gTTS и
+холодные соединения.
+
+API (JSON):
+    POST /jobs              {"text": ..., "output": "name.ogg", "priority": 0}
+                            -> 202 {"id": ..., "status": "queued", ...}
+    GET  /jobs              состояние всех заданий
+    GET  /jobs/<id>         состояние задания
+    GET  /jobs/<id>/events  поток состояний (по строке JSON на изменение)
+                            до завершения задания (done или failed)
+
+Слушает DAEMON_HOST:DAEMON_PORT или Unix-сокет DAEMON_SOCKET:
+    curl -d '{"text": "Привет"}' http://127.0.0.1:8750/jobs
+    curl --unix-socket tts.sock http://localhost/jobs/<id>/events
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import uuid
+
+import audio_from_text_generator_batch as batch
+from audio_from_text_generator_chunks_gtts import CONFIG as PIPELINE_CONFIG, log
+
+CONFIG = {
+    "host": os.getenv("DAEMON_HOST", "127.0.0.1"),
+    "port": int(os.getenv("DAEMON_PORT", 8750)),
+    # Unix-сокет вместо TCP (пустое значение - слушать host:port)
+    "socket": os.getenv("DAEMON_SOCKET", ""),
+    # Результаты заданий; output задания - путь внутри этой директории
+    "output_dir": os.getenv("DAEMON_OUTPUT_DIR", "output"),
+    # Завершенных заданий, состояние которых хранится для GET
+    "keep_jobs": max(1, int(os.getenv("DAEMON_KEEP_JOBS", 1000))),
+    "max_text_size": max(1, int(os.getenv("DAEMON_MAX_TEXT_MB", 50))) * 2**20,
+}
+
+FINAL_STATUSES = ("done", "failed")
+
+
+class JobRegistry:
+    """
+    Задания демона и уведомление о смене их состояния
+    version растет при каждом изменении любого задания; потоки,
+    отдающие /events, ждут его изменения на условной переменной.
+    """
+
+    def __init__(self):
+        self.jobs = OrderedDict()  # id -> BatchDocument
+        self.order = itertools.count(1)  # Порядок поступления (для очереди)
+        self.version = 0
+        self.cond = threading.Condition()
+
+    def add(self, text: str, output: str, priority: int) -> tuple:
+        # Случайный id: имена результатов не повторяются после перезапуска
+        job_id = uuid.uuid4().hex[:12]
+        with self.cond:
+            doc = batch.BatchDocument(
+                next(self.order), f"job_{job_id}", output, priority, text=text
+            )
+            self.jobs[job_id] = doc
+            self._prune()
+            return job_id, doc
+
+    def _prune(self):
+        """Удаление старейших завершенных заданий сверх keep_jobs"""
+        finished = [
+            job_id
+            for job_id, doc in self.jobs.items()
+            if doc.future is not None and doc.future.done()
+        ]
+        for job_id in finished[: max(0, len(finished) - CONFIG["keep_jobs"])]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str):
+        with self.cond:
+            return self.jobs.get(job_id)
+
+    def states(self) -> list:
+        with self.cond:
+            return [job_state(job_id, doc) for job_id, doc in self.jobs.items()]
+
+    def updated(self, doc):
+        """Обработчик BatchRunner.on_update: будит ожидающих /events"""
+        with self.cond:
+            self.version += 1
+            self.cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        """Ожидание изменения version после seen, возвращает текущую"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+
+def job_state(job_id: str, doc) -> dict:
+    return {"id": job_id, **doc.state()}
+
+
+def resolve_output(name: str, job_id: str) -> str:
+    """Путь результата внутри output_dir (по умолчанию <id>.<расширение OUTPUT_FILE>)"""
+    ext = os.path.splitext(PIPELINE_CONFIG["output"])[1] or ".ogg"
+    name = name or f"job_{job_id}{ext}"
+    root = os.path.abspath(CONFIG["output_dir"])
+    path = os.path.abspath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"output вне {CONFIG['output_dir']}: {name}")
+    return path
+
+
+class DaemonHandler(BaseHTTPRequestHandler):
+    """Обработчик HTTP API; server.registry и server.runner - общие для всех"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        log("HTTP " + format, "DEBUG", *args)
+
+    def reply(self, status: int, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self.reply(404, {"error": "not found"})
+        try:
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                if length < 0:
+                    raise ValueError(f"Content-Length {length}")
+            except ValueError:
+                # Где кончается тело, неизвестно: соединение не переиспользуется
+                self.close_connection = True
+                raise
+            if length > CONFIG["max_text_size"]:
+                # Тело не читается, поэтому соединение закрывается после ответа
+                self.close_connection = True
+                return self.reply(413, {"error": "слишком большой запрос"})
+            request = json.loads(self.rfile.read(length).decode("utf-8"))
+            text = request["text"]
+            if not isinstance(text, str) or not text.strip():
+                raise ValueError("пустой text")
+            priority = int(request.get("priority", 0))
+            output = request.get("output") or ""
+            resolve_output(output, "0")  # Проверка до постановки в очередь
+        except (KeyError, TypeError, ValueError) as e:
+            return self.reply(400, {"error": f"{type(e).__name__} - {str(e)}"})
+
+        registry = self.server.registry
+        job_id, doc = registry.add(text, "", priority)
+        doc.output = resolve_output(output, job_id)
+        log(f"Задание {job_id}: {len(text):,} символов -> {doc.output}", "INFO")
+        self.server.runner.submit(doc)
+        self.reply(202, job_state(job_id, doc))
+
+    def do_GET(self):
+        parts = [part for part in self.path.split("?")[0].split("/") if part]
+        registry = self.server.registry
+        if parts == ["jobs"]:
+            return self.reply(200, registry.states())
+        if len(parts) not in (2, 3) or parts[0] != "jobs":
+            return self.reply(404, {"error": "not found"})
+        doc = registry.get(parts[1])
+        if doc is None:
+            return self.reply(404, {"error": f"нет задания {parts[1]}"})
+        if len(parts) == 2:
+            return self.reply(200, job_state(parts[1], doc))
+        if parts[2] != "events":
+            return self.reply(404, {"error": "not found"})
+        self.stream_events(parts[1], doc)
+
+    def stream_events(self, job_id: str, doc):
+        """Поток состояний задания: строка JSON на каждое изменение"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        registry = self.server.registry
+        seen = -1
+        last = None
+        while True:
+            seen = registry.wait(seen, timeout=30)
+            state = job_state(job_id, doc)
+            if state != last:
+                line = json.dumps(state, ensure_ascii=False) + "\n"
+                try:
+                    self.wfile.write(line.encode("utf-8"))
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    return  # Клиент отключился, задание продолжается
+                last = state
+            if state["status"] in FINAL_STATUSES:
+                return
+
+
+class DaemonHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class DaemonUnixServer(socketserver.ThreadingUnixStreamServer):
+    """HTTP поверх Unix-сокета (доступ ограничен правами на файл сокета)"""
+
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)  # Сокет от прошлого запуска
+        super().server_bind()
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def main():
+    """Запуск демона до SIGTERM или Ctrl-C"""
+    start_time = datetime.now()
+    registry = JobRegistry()
+    runner = batch.BatchRunner(on_update=registry.updated)
+
+    if CONFIG["socket"]:
+        server = DaemonUnixServer(CONFIG["socket"], DaemonHandler)
+        address = CONFIG["socket"]
+    else:
+        server = DaemonHTTPServer((CONFIG["host"], CONFIG["port"]), DaemonHandler)
+        address = "http://%s:%d" % server.server_address[:2]
+    server.registry = registry
+    server.runner = runner
+
+    # SIGTERM завершает так же, как Ctrl-C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    log("=" * 60)
+    log(f"🚀 ДЕМОН КОНВЕРТАЦИИ: {address}")
+    log(f"Движок синтеза: {runner.engine.name}, потоков: {PIPELINE_CONFIG['workers']}")
+    log("=" * 60)
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        log("Остановка демона...", "INFO")
+        server.server_close()
+        runner.close(cancel=True)
+        log(f"Демон работал {datetime.now() - start_time}", "INFO")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,10 +11,11 @@
 # VERBOSE = "true"
 # SHOW_PROGRESS = "true"
 # OVERWRITE_OUTPUT = "true"
+# LOOP_COPY = "true"
 
 from datetime import datetime
 from dotenv import load_dotenv
-from gtts import gTTS
+from tts_engines import get_engine
 import subprocess
 import os
 import sys
@@ -39,10 +40,22 @@ CONFIG = {
     'language': os.getenv('LANGUAGE'),
     'verbose': os.getenv('VERBOSE').lower() == 'true',
     'show_progress': os.getenv('SHOW_PROGRESS').lower() == 'true',
-    'overwrite': os.getenv('OVERWRITE_OUTPUT').lower() == 'true'
+    'overwrite': os.getenv('OVERWRITE_OUTPUT').lower() == 'true',
+    # DURATION > 0: кодировать фрагмент один раз и зацикливать копированием пакетов
+    # (только для кодеков без задержки кодера, см. gapless_codec)
+    'loop_copy': os.getenv('LOOP_COPY', 'true').lower() == 'true'
 }
 
 
+def gapless_codec(codec: str) -> bool:
+    """
+    Кодек без задержки кодера (PCM, FLAC, ALAC): повторы, склеенные
+    копированием пакетов, идут без пауз. У Opus (pre-skip), MP3, AAC и
+    Vorbis каждый повтор начинался бы с тишины задержки кодера.
+    """
+    return codec.startswith('pcm_') or codec in ('flac', 'alac')
+
+
 def log(message: str):
     if CONFIG['verbose']:
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -68,8 +81,57 @@ def print_progress(current: float, total: float):
     sys.stdout.flush()
 
 
+def encode_args() -> list:
+    """Параметры кодирования в целевой формат"""
+    return [
+        '-c:a', CONFIG['codec'],
+        '-ar', CONFIG['sample_rate'],
+        '-ac', CONFIG['channels'],
+        '-b:a', CONFIG['bitrate'],
+    ]
+
+
+def run_ffmpeg(cmd: list, duration: int):
+    """Запуск FFmpeg с прогресс-баром по out_time (duration - длительность результата)"""
+    cmd = list(cmd)
+    if CONFIG['show_progress']:
+        cmd[1:1] = ['-progress', 'pipe:1']
+
+    process = subprocess.Popen(
+        cmd,
+        stderr=subprocess.PIPE,
+        stdout=subprocess.PIPE, # Изменено на PIPE для stdout
+        text=True,
+        bufsize=1,
+        universal_newlines=True
+    )
+
+    if CONFIG['show_progress']:
+        if duration > 0: # Добавляем проверку на duration > 0
+            print("\nПрогресс обработки:")
+            while True:
+                line = process.stdout.readline() # Изменено на stdout
+                if not line:
+                    break
+                if 'out_time=' in line:
+                    current_time = parse_time(line.split('=')[1].strip())
+                    print_progress(current_time, duration)
+        else: # Если duration == 0, просто выводим сообщение, что обработка идет
+            print("\nОбработка аудио в процессе (прогресс не отображается для duration=0)...")
+            while True:
+                line = process.stdout.readline() # Изменено на stdout
+                if not line:
+                    break
+
+    process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+
+
 def main():
     start_script = datetime.now()
+    # Фрагмент в целевом формате для зацикливания (расширение - как у результата)
+    loop_file = os.path.splitext(CONFIG['temp_file'])[0] + '_loop' + os.path.splitext(CONFIG['output'])[1]
 
     try:
         log("🚀 Запуск скрипта генерации аудио")
@@ -85,7 +147,8 @@ def main():
         # Генерация TTS
         log("🔊 Генерация аудио с помощью gTTS...")
         tts_start = datetime.now()
-        gTTS(text=text, lang=CONFIG['language']).save(CONFIG['temp_file'])
+        engine = get_engine('gtts', language=CONFIG['language'])
+        engine.synthesize_to_file(text, CONFIG['temp_file'])
         log(f"✔ Аудио сгенерировано за {datetime.now() - tts_start}")
 
         # Сборка команды FFmpeg
@@ -94,53 +157,36 @@ def main():
             '-y' if CONFIG['overwrite'] else '-n',
             '-loglevel', 'error',
         ]
-        if CONFIG['duration'] > 0: # Добавляем stream_loop только если duration > 0
-            cmd.extend(['-stream_loop', '-1'])
-        cmd.extend([ # Добавляем остальную часть команды
-            '-i', CONFIG['temp_file'],
-            '-c:a', CONFIG['codec'],
-            '-ar', CONFIG['sample_rate'],
-            '-ac', CONFIG['channels'],
-            '-b:a', CONFIG['bitrate'],
-        ])
-        if CONFIG['duration'] > 0: # Добавляем -t только если duration > 0
-            cmd.extend(['-t', str(CONFIG['duration'])])
+        loop_copy = CONFIG['duration'] > 0 and CONFIG['loop_copy']
+        if loop_copy and not gapless_codec(CONFIG['codec']):
+            log(f"ℹ LOOP_COPY не применяется для {CONFIG['codec']}: зацикливание с перекодированием")
+            loop_copy = False
+        if loop_copy:
+            # Фрагмент кодируется один раз, длинный результат собирается
+            # копированием его пакетов; -t обрезает последний повтор
+            log("⚙ Кодирование фрагмента для зацикливания...")
+            subprocess.run(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-i', CONFIG['temp_file'], *encode_args(), loop_file],
+                check=True,
+                capture_output=True,
+            )
+            cmd.extend([
+                '-stream_loop', '-1',
+                '-i', loop_file,
+                '-c', 'copy',
+                '-t', str(CONFIG['duration']),
+            ])
+        else:
+            if CONFIG['duration'] > 0: # Добавляем stream_loop только если duration > 0
+                cmd.extend(['-stream_loop', '-1'])
+            cmd.extend(['-i', CONFIG['temp_file'], *encode_args()]) # Добавляем остальную часть команды
+            if CONFIG['duration'] > 0: # Добавляем -t только если duration > 0
+                cmd.extend(['-t', str(CONFIG['duration'])])
         cmd.append(CONFIG['output'])
 
-        if CONFIG['show_progress']:
-            cmd[1:1] = ['-progress', 'pipe:1']
-
         # Обработка аудио
         log("⚙ Начало обработки аудио...")
-        process = subprocess.Popen(
-            cmd,
-            stderr=subprocess.PIPE,
-            stdout=subprocess.PIPE, # Изменено на PIPE для stdout
-            text=True,
-            bufsize=1,
-            universal_newlines=True
-        )
-
-        if CONFIG['show_progress']:
-            if CONFIG['duration'] > 0: # Добавляем проверку на duration > 0
-                print("\nПрогресс обработки:")
-                while True:
-                    line = process.stdout.readline() # Изменено на stdout
-                    if not line:
-                        break
-                    if 'out_time=' in line:
-                        current_time = parse_time(line.split('=')[1].strip())
-                        print_progress(current_time, CONFIG['duration'])
-            else: # Если duration == 0, просто выводим сообщение, что обработка идет
-                print("\nОбработка аудио в процессе (прогресс не отображается для duration=0)...")
-                while True:
-                    line = process.stdout.readline() # Изменено на stdout
-                    if not line:
-                        break
-
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, cmd)
+        run_ffmpeg(cmd, CONFIG['duration'])
 
         print()  # Новая строка после прогресс-бара
         log(f"✅ Обработка завершена за {datetime.now() - start_script}")
@@ -150,9 +196,11 @@ def main():
         print(f"\n❌ Критическая ошибка: {str(e)}", file=sys.stderr)
         sys.exit(1)
     finally:
-        if os.path.exists(CONFIG['temp_file']):
+        temp_files = [path for path in (CONFIG['temp_file'], loop_file) if os.path.exists(path)]
+        if temp_files:
             log("🧹 Очистка временных файлов")
-            os.remove(CONFIG['temp_file'])
+            for path in temp_files:
+                os.remove(path)
         log("🛑 Скрипт завершил работу")
 
 
@@ -3,12 +3,16 @@
     Выходный голосовой файл генерируется, но качество ужасное.
     Следует разобраться с настройками pyttsx3 для обеспечения приемлемого качества звучания
 '''
-import pyttsx3
 import os
+import shutil
 import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from dotenv import load_dotenv
 import sys
+from tts_engines import Pyttsx3Engine, get_engine
+from tts_common import split_text, write_concat_list
 
 load_dotenv()
 
@@ -20,6 +24,7 @@ CONFIG = {
     'show_progress': os.getenv('SHOW_PROGRESS', 'true').lower() == 'true',
     'overwrite': os.getenv('OVERWRITE_OUTPUT', 'true').lower() == 'true',
     'language': os.getenv('LANGUAGE', 'ru'), # Язык для pyttsx3
+    'voice': os.getenv('VOICE', 'Russian'),  # ID голоса pyttsx3
     'rate': int(os.getenv('RATE', 150)),       # Скорость речи pyttsx3
     'volume': float(os.getenv('VOLUME', 1.0)),   # Громкость pyttsx3
     'codec': os.getenv('AUDIO_CODEC', 'libopus'), # Аудио кодек ffmpeg
@@ -27,6 +32,10 @@ CONFIG = {
     'bitrate': os.getenv('BITRATE', '164k'),   # Битрейт ffmpeg
     'sample_rate': os.getenv('SAMPLE_RATE', '48000'), # Частота дискретизации ffmpeg
     'duration': int(os.getenv('DURATION', 0)),   # Длительность зацикливания (0 - не зацикливать)
+    'chunk_size': max(500, int(os.getenv('CHUNK_SIZE', 3500))), # Размер части текста (символов)
+    'chunking': os.getenv('CHUNKING', 'greedy').lower(), # Разбиение: greedy или anchored
+    'workers': max(1, int(os.getenv('WORKERS', os.cpu_count() or 1))), # Процессов синтеза
+    'temp_dir': os.getenv('TEMP_DIR', 'tts_chunks_pyttsx3'), # Части WAV до сборки
 }
 
 def get_timestamp() -> str:
@@ -38,6 +47,11 @@ def log_message(message: str):
     if CONFIG['verbose']:
         print(f"[{get_timestamp()}] {message}", flush=True)
 
+def log_split(message: str, level: str = "INFO", *args):
+    """Сообщения разбиения текста (tts_common) в log_message."""
+    if CONFIG['verbose']:
+        log_message(message % args if args else message)
+
 def read_input_text(input_file: str) -> str:
     """Читает текст из входного файла."""
     log_message(f"📖 Чтение текста из файла: {input_file}")
@@ -53,45 +67,86 @@ def read_input_text(input_file: str) -> str:
     log_message(f"Прочитано символов: {len(text)}")
     return text
 
-def initialize_tts_engine() -> pyttsx3.Engine:
+def initialize_tts_engine() -> Pyttsx3Engine:
+    """Возвращает движок pyttsx3 (инициализируется один раз на процесс)."""
     log_message("⚙️ Инициализация TTS движка")
-    engine = pyttsx3.init()
+    engine = get_engine(
+        'pyttsx3',
+        voice=CONFIG['voice'],
+        rate=CONFIG['rate'],
+        volume=CONFIG['volume'],
+    )
 
-    voices = engine.getProperty('voices')
     log_message("Доступные голоса:")
-    for voice in voices:
+    for voice in engine.voices:
         log_message(f" - Имя: {voice.name}")
         log_message(f"   ID: {voice.id}")
         log_message(f"   Язык(и): {voice.languages}")
         log_message(f"   Пол: {voice.gender}")
         log_message(f"   Возраст: {voice.age}")
 
-    russian_voice_id = "Russian" # Явно указываем ID голоса "Russian"
-
-    try: # Добавим try-except блок на случай, если голос не найдется
-        engine.setProperty('voice', russian_voice_id)
-        log_message(f"Голос установлен: {russian_voice_id}")
-    except Exception as e:
-        log_message(f"❌ Ошибка установки голоса '{russian_voice_id}': {e}")
+    if engine.voice_error is None:
+        log_message(f"Голос установлен: {engine.voice}")
+    else:
+        log_message(f"❌ Ошибка установки голоса '{CONFIG['voice']}': {engine.voice_error}")
         log_message("Используется голос по умолчанию.")
 
     return engine
 
-def generate_speech_file(engine: pyttsx3.Engine, text: str, temp_file: str):
-    """Генерирует речь из текста и сохраняет во временный файл."""
-    log_message("🗣️ Генерация речи...")
-    engine.save_to_file(text, temp_file)
-    engine.runAndWait() # Ожидание завершения обработки речи
-    log_message(f"🔊 Аудио сохранено во временный файл: {temp_file}")
-
-def convert_audio_to_output_format(temp_file: str, output_file: str):
-    """Конвертирует временный аудио файл в целевой формат, используя FFmpeg."""
+def engine_options() -> dict:
+    """Параметры движка pyttsx3 из конфигурации."""
+    return {'voice': CONFIG['voice'], 'rate': CONFIG['rate'], 'volume': CONFIG['volume']}
+
+def init_worker(options: dict):
+    """Инициализация движка в процессе пула (один раз на процесс)."""
+    get_engine('pyttsx3', **options)
+
+def render_chunk(task: tuple) -> str:
+    """Синтез одной части текста в WAV-файл (выполняется в процессе пула)."""
+    options, text, path = task
+    get_engine('pyttsx3', **options).synthesize_to_file(text, path)
+    return path
+
+def generate_speech_files(engine: Pyttsx3Engine, chunks: list, temp_dir: str) -> list:
+    """
+    Генерирует речь для частей текста, возвращает пути к WAV в исходном порядке.
+    pyttsx3 синтезирует в один поток, а экземпляр движка не потокобезопасен,
+    поэтому части распределяются по WORKERS процессам, в каждом свой движок.
+    """
+    paths = [os.path.join(temp_dir, f'part_{idx + 1:05d}.wav') for idx in range(len(chunks))]
+    workers = min(CONFIG['workers'], len(chunks))
+    log_message(f"🗣️ Генерация речи: {len(chunks)} частей, процессов: {workers}")
+
+    if workers == 1:
+        for idx, (text, path) in enumerate(zip(chunks, paths)):
+            engine.synthesize_to_file(text, path)
+            if CONFIG['show_progress']:
+                log_message(f"   Часть {idx + 1}/{len(chunks)} готова")
+        return paths
+
+    # spawn: дочерний процесс не наследует состояние драйвера pyttsx3 родителя
+    options = engine_options()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(options,),
+    ) as pool:
+        tasks = [(options, text, path) for text, path in zip(chunks, paths)]
+        for idx, _ in enumerate(pool.map(render_chunk, tasks)):
+            if CONFIG['show_progress']:
+                log_message(f"   Часть {idx + 1}/{len(chunks)} готова")
+    return paths
+
+def convert_audio_to_output_format(concat_list: str, output_file: str):
+    """Склеивает части по списку и конвертирует в целевой формат, используя FFmpeg."""
     log_message("🔄 Конвертация аудио...")
     ffmpeg_command = [
         'ffmpeg',
         '-y' if CONFIG['overwrite'] else '-n', # Перезапись или пропуск, если файл существует
         '-loglevel', 'error', # Только ошибки в лог FFmpeg
-        '-i', temp_file,      # Входной файл
+        '-f', 'concat', '-safe', '0', # Части в порядке списка
+        '-i', concat_list,    # Входной список частей
         '-c:a', CONFIG['codec'],    # Аудио кодек
         '-ar', CONFIG['sample_rate'], # Частота дискретизации
         '-ac', CONFIG['channels'],   # Каналы
@@ -109,23 +164,27 @@ def convert_audio_to_output_format(temp_file: str, output_file: str):
         log_message(f"❌ Ошибка FFmpeg: {error_message}")
         sys.exit(1)
 
-def cleanup_temp_file(temp_file: str):
-    """Удаляет временный файл."""
-    if os.path.exists(temp_file):
-        os.remove(temp_file)
-        log_message(f"🧹 Временный файл удален: {temp_file}")
+def cleanup_temp_dir(temp_dir: str):
+    """Удаляет временную директорию с частями."""
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        log_message(f"🧹 Временные файлы удалены: {temp_dir}")
 
 def process_text_to_speech():
     """Главная функция для обработки текста в речь."""
     log_message("🚀 Запуск скрипта")
     start_time = datetime.now()
-    temp_file = "temp_audio.wav" # Временный файл для pyttsx3 (WAV формат)
+    temp_dir = CONFIG['temp_dir'] # Части в WAV формате pyttsx3
 
     try:
         text_to_process = read_input_text(CONFIG['input'])
+        chunks = split_text(text_to_process, CONFIG['chunk_size'], chunking=CONFIG['chunking'], log=log_split)
+        del text_to_process
+        log_message(f"Частей текста: {len(chunks)}")
         tts_engine = initialize_tts_engine()
-        generate_speech_file(tts_engine, text_to_process, temp_file)
-        convert_audio_to_output_format(temp_file, CONFIG['output'])
+        os.makedirs(temp_dir, exist_ok=True)
+        paths = generate_speech_files(tts_engine, chunks, temp_dir)
+        convert_audio_to_output_format(write_concat_list(paths, os.path.join(temp_dir, 'concat_list.txt')), CONFIG['output'])
 
         end_time = datetime.now()
         log_message(f"✅ Успешно завершено за {end_time - start_time}")
@@ -136,7 +195,7 @@ def process_text_to_speech():
         sys.exit(1)
 
     finally:
-        cleanup_temp_file(temp_file)
+        cleanup_temp_dir(temp_dir)
         log_message("🛑 Завершение работы")
 
 
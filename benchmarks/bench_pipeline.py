@@ -0,0 +1,163 @@
+"""
+Бенчмарк конвейера audio_from_text_generator_chunks_gtts на локальном стенде
+Поднимает fake_tts_server (имитация API Google TTS с задержками, 429
+и зависаниями; доли ошибок задаются на HTTP-запрос, а gTTS делает один
+запрос на каждые ~100 символов чанка), направляет на него gTTS через GTTS_BASE_URL и по
+отдельности замеряет этапы: разбиение текста, синтез чанков и финальную
+сборку FFmpeg (если FFmpeg установлен). Зависший запрос стенд держит
+--hang секунд; при --client-timeout меньше hang (по умолчанию) клиент
+получает таймаут чтения, иначе - ответ 504.
+
+Запуск (по умолчанию - тексты 2 и 10 тыс. символов, пара минут):
+    python benchmarks/bench_pipeline.py --workers 4
+    python benchmarks/bench_pipeline.py --sizes 10000,100000,1500000 --skip-finalize
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+os.environ["VERBOSE"] = "false"  # Лог каждого чанка искажает замеры
+
+import audio_from_text_generator_chunks_gtts as pipeline  # noqa: E402
+from bench_split_text import CORPORA, make_text  # noqa: E402
+from fake_tts_server import FakeTTSServer  # noqa: E402
+
+
+def run_case(size: int, args, server: FakeTTSServer, work_dir: str) -> dict:
+    """Один прогон конвейера на тексте заданного размера, возвращает замеры"""
+    text = make_text(size, CORPORA["смешанный"])
+    case_dir = os.path.join(work_dir, str(size))
+    pipeline.CONFIG.update(
+        temp_dir=os.path.join(case_dir, "chunks"),
+        output=os.path.join(case_dir, "output.ogg"),
+        overwrite=True,
+        resume=False,
+    )
+    os.makedirs(pipeline.CONFIG["temp_dir"])
+    pipeline.reset_metrics()
+    server_before = dict(server.stats, connections=server.connections)
+    timings = {}
+
+    started = time.perf_counter()
+    chunks = pipeline.split_text(text, pipeline.CONFIG["chunk_size"])
+    timings["split"] = time.perf_counter() - started
+
+    engine = pipeline.create_engine()
+    if args.fixed_rate:
+        limiter = pipeline.TokenBucket(args.rate_limit, args.workers)
+    else:
+        # Без файла состояния: прогоны не влияют друг на друга
+        limiter = pipeline.AdaptiveRateLimiter(
+            args.rate_limit, args.workers, max_rate=args.rate_max
+        )
+    manifest = pipeline.JobManifest(os.path.join(case_dir, "job.json"), {})
+    started = time.perf_counter()
+    results = pipeline.synthesize_chunks(engine, chunks, len(chunks), manifest, limiter)
+    timings["synthesis"] = time.perf_counter() - started
+
+    parts = [path for path in results if path]
+    timings["finalize"] = None
+    if shutil.which("ffmpeg") and parts and not args.skip_finalize:
+        started = time.perf_counter()
+        pipeline.finalize_parts(parts)
+        timings["finalize"] = time.perf_counter() - started
+
+    server_after = dict(server.stats, connections=server.connections)
+    server_delta = {k: server_after[k] - server_before[k] for k in server_after}
+    return {
+        "chars": len(text),
+        "chunks": len(chunks),
+        "ok": len(parts),
+        "timings": timings,
+        "stats": dict(pipeline.STATS),
+        "server": server_delta,
+        "limiter": limiter.summary() if not args.fixed_rate else None,
+    }
+
+
+def report(result: dict):
+    timings = result["timings"]
+    total = sum(t for t in timings.values() if t)
+    finalize = f"{timings['finalize']:.2f} с" if timings["finalize"] is not None else "пропущена"
+    stats = result["stats"]
+    print(
+        f"{result['chars']:>9,} симв | чанков {result['ok']}/{result['chunks']} | "
+        f"всего {total:.2f} с | {result['ok'] / timings['synthesis']:.2f} чанк/с\n"
+        f"    разбиение {timings['split'] * 1000:.1f} мс | синтез {timings['synthesis']:.2f} с | "
+        f"сборка {finalize}\n"
+        f"    попыток {stats['requests']}, повторов {stats['retries']}, "
+        f"429: {stats['throttled']}, таймаутов {stats['timeouts']}, "
+        f"пауз {stats['sleep_seconds']:.1f} с, ожидание лимита {stats['limiter_wait_seconds']:.1f} с\n"
+        f"    HTTP-запросов к стенду {result['server']['requests']}, "
+        f"зависших {result['server']['hung']}, "
+        f"TCP-соединений {result['server']['connections']}"
+    )
+    if result["limiter"]:
+        print(f"    автоподстройка: {result['limiter']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера на локальном стенде TTS")
+    parser.add_argument("--sizes", default="2000,10000", help="размеры текстов через запятую")
+    parser.add_argument("--chunk-size", type=int, default=3500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate-limit", type=float, default=50.0, help="HTTP-запросов/сек (стартовая)")
+    parser.add_argument("--rate-max", type=float, default=1000.0, help="предел автоподстройки")
+    parser.add_argument("--fixed-rate", action="store_true", help="TokenBucket без автоподстройки")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--rate-429", type=float, default=0.002, help="доля ответов 429 (на HTTP-запрос)")
+    parser.add_argument("--rate-timeout", type=float, default=0.001, help="доля зависаний (на HTTP-запрос)")
+    parser.add_argument("--hang", type=float, default=0.5, help="сек до ответа 504 на зависший запрос")
+    parser.add_argument("--client-timeout", type=float, default=0.25, help="GTTS_TIMEOUT (сек)")
+    parser.add_argument("--retry-delay", type=float, default=0.5)
+    parser.add_argument("--skip-finalize", action="store_true", help="не замерять сборку FFmpeg")
+    parser.add_argument("--show-log", action="store_true", help="выводить WARN/ERROR конвейера")
+    args = parser.parse_args()
+
+    if not args.show_log:
+        # Предупреждения о каждом 429 выводятся и при VERBOSE=false
+        pipeline.log = lambda message, level="INFO", *args: None
+
+    server = FakeTTSServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        rate_timeout=args.rate_timeout,
+        hang=args.hang,
+    )
+    server.start()
+
+    pipeline.CONFIG.update(
+        engine="gtts",
+        gtts_base_url=server.url,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        cache_dir="",
+        retry_delay=args.retry_delay,
+        backoff_factor=1,
+        timeout_retry_delay=args.retry_delay,
+        gtts_timeout=args.client_timeout,
+    )
+    print(
+        f"Стенд {server.url}: задержка {args.latency}±{args.jitter} с, "
+        f"429 {args.rate_429:.1%}, зависания {args.rate_timeout:.1%} "
+        f"(ответ через {args.hang} с, таймаут клиента {args.client_timeout} с); "
+        f"WORKERS={args.workers}, CHUNK_SIZE={args.chunk_size}"
+    )
+
+    with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+        for size in (int(s) for s in args.sizes.split(",")):
+            report(run_case(size, args, server, work_dir))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Микро-бенчмарк разбиения текста: split_text против прежней реализации
+(восемь rfind на каждый чанк и склейка строк через +=).
+Перед замерами проверяет, что обе реализации дают одинаковые чанки.
+
+Запуск:
+    python benchmarks/bench_split_text.py [размер_текста] [chunk_size]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["VERBOSE"] = "false"  # DEBUG-логи искажают замеры
+
+from audio_from_text_generator_chunks_gtts import iter_chunks, split_text  # noqa: E402
+
+SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " "]
+
+
+def split_text_reference(text: str, chunk_size: int) -> list:
+    """Прежняя реализация split_text (без логирования) - эталон для сравнения"""
+    chunks = []
+    start = 0
+    text_length = len(text)
+
+    while start < text_length:
+        end = min(start + chunk_size, text_length)
+        if end < text_length:
+            best_pos = -1
+            for sep in SEPARATORS:
+                pos = text.rfind(sep, start, end + len(sep))
+                if pos > best_pos:
+                    best_pos = pos
+            if best_pos != -1 and (best_pos - start) > chunk_size * 0.5:
+                end = best_pos + 1
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end
+
+    if len(chunks) > 1:
+        merged = []
+        buffer = chunks[0]
+        for chunk in chunks[1:]:
+            if len(buffer) + len(chunk) <= chunk_size * 1.2:
+                buffer += " " + chunk
+            else:
+                merged.append(buffer)
+                buffer = chunk
+        merged.append(buffer)
+        return merged
+
+    return chunks
+
+
+CORPORA = {
+    # Все виды разделителей встречаются часто
+    "смешанный": [" "] * 8 + [", ", ". ", "! ", "? ", "; ", "\n", "\n\n"],
+    # Сплошная проза: редкие абзацы, почти нет "!", "?", ";"
+    "проза": [" "] * 12 + [", ", ". "] * 2,
+}
+
+
+def make_text(size: int, tails: list, seed: int = 42) -> str:
+    """Синтетический текст из слов, разделенных заданными окончаниями"""
+    rnd = random.Random(seed)
+    words = ["текст", "глава", "предложение", "часть", "слово", "аудио", "книга"]
+    out = []
+    length = 0
+    while length < size:
+        word = rnd.choice(words)
+        tail = rnd.choice(tails)
+        out.append(word + tail)
+        length += len(word) + len(tail)
+    return "".join(out)[:size].strip()
+
+
+def best_of(func, repeat: int = 5) -> float:
+    """Минимальное время из нескольких прогонов"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1_500_000
+    chunk_sizes = [int(sys.argv[2])] if len(sys.argv) > 2 else [500, 1000, 3500]
+    for corpus, tails in CORPORA.items():
+        text = make_text(size, tails)
+        print(f"Текст «{corpus}»: {len(text):,} символов")
+        for chunk_size in chunk_sizes:
+            bench(text, chunk_size)
+
+
+def bench(text: str, chunk_size: int):
+    """Сравнение реализаций на одном тексте и размере чанка"""
+    blocks = [text[i : i + (1 << 20)] for i in range(0, len(text), 1 << 20)]
+    expected = split_text_reference(text, chunk_size)
+    assert split_text(text, chunk_size) == expected, "split_text расходится с эталоном"
+    assert list(iter_chunks(blocks, chunk_size)) == expected, "iter_chunks расходится"
+
+    old = best_of(lambda: split_text_reference(text, chunk_size))
+    new = best_of(lambda: split_text(text, chunk_size))
+    streamed = best_of(lambda: list(iter_chunks(blocks, chunk_size)))
+    print(
+        f"  CHUNK_SIZE={chunk_size:5d} чанков={len(expected):5d} | "
+        f"прежний: {old * 1000:7.1f} мс | split_text: {new * 1000:7.1f} мс "
+        f"(x{old / new:.2f}) | iter_chunks: {streamed * 1000:7.1f} мс"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Локальный стенд API Google Translate TTS для бенчмарков
+Принимает те же запросы batchexecute, что отправляет gTTS, и отвечает
+в том же формате корректным MP3 (тишина, длительность пропорциональна
+тексту). Позволяет задать задержку ответа, разброс, долю ответов 429
+и долю "зависших" запросов: стенд держит их hang секунд и отвечает 504
+Gateway Timeout. Если hang больше таймаута клиента (GTTS_TIMEOUT), клиент
+не дожидается ответа - срабатывает его собственный таймаут чтения.
+
+Запуск отдельно:
+    python benchmarks/fake_tts_server.py --port 8765 --latency 0.3 --rate-429 0.05
+    GTTS_BASE_URL=http://127.0.0.1:8765 python audio_from_text_generator_chunks_gtts.py
+"""
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_engines import FakeEngine  # noqa: E402
+
+
+class FakeTTSServer(ThreadingHTTPServer):
+    """
+    HTTP-сервер с настраиваемым поведением и счетчиками запросов
+    Параметры:
+        latency - базовая задержка ответа (сек)
+        jitter - случайный разброс задержки (+/- сек)
+        rate_429 - доля ответов 429 Too Many Requests
+        rate_timeout - доля зависших запросов (hung): ответ 504 после hang
+            секунд, если клиент к тому времени не закрыл соединение
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_429: float = 0.0,
+        rate_timeout: float = 0.0,
+        hang: float = 1.0,
+        seed: int = 0,
+    ):
+        super().__init__(address, FakeTTSHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.rate_timeout = rate_timeout
+        self.hang = hang
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "ok": 0, "throttled": 0, "hung": 0, "bytes": 0}
+        self.connections = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def pick_outcome(self) -> tuple:
+        """Выбор исхода запроса (ok, throttled, hung) и задержки ответа"""
+        with self.lock:
+            roll = self.random.random()
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        if roll < self.rate_429:
+            return "throttled", delay
+        if roll < self.rate_429 + self.rate_timeout:
+            return "hung", self.hang
+        return "ok", delay
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.stats[name] += value
+
+    def start(self) -> threading.Thread:
+        """Запуск сервера в фоновом потоке"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class FakeTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Поддержка keep-alive
+    # Заголовки и тело уходят отдельными send(): без TCP_NODELAY на
+    # keep-alive соединении каждый ответ ждет delayed ACK клиента (~40 мс)
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass  # Без вывода каждого запроса в консоль
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length).decode("utf-8")
+        self.server.count("requests")
+
+        outcome, delay = self.server.pick_outcome()
+        time.sleep(delay)
+        self.server.count(outcome)
+
+        if outcome == "throttled":
+            return self.reply(429, b"Too Many Requests")
+        if outcome == "hung":
+            try:
+                return self.reply(504, b"Gateway Timeout")
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True  # Клиент ушел по своему таймауту
+                return
+
+        audio = FakeEngine().synthesize([self.extract_text(body)])[0]
+        payload = base64.b64encode(audio).decode("ascii")
+        rpc = json.dumps(
+            [["wrb.fr", "jQ1olc", f'["{payload}"]', None, None, None, "generic"]],
+            separators=(",", ":"),
+        )
+        self.server.count("bytes", len(audio))
+        self.reply(200, (")]}'\n\n" + rpc + "\n").encode("utf-8"))
+
+    @staticmethod
+    def extract_text(body: str) -> str:
+        """Текст из тела запроса batchexecute (f.req=[[["jQ1olc","[text,...]"...]]])"""
+        try:
+            rpc = json.loads(parse_qs(body)["f.req"][0])
+            return json.loads(rpc[0][0][1])[0]
+        except (KeyError, IndexError, ValueError):
+            return ""
+
+    def reply(self, status: int, data: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный стенд Google TTS")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-timeout", type=float, default=0.0)
+    parser.add_argument("--hang", type=float, default=5.0, help="сек до ответа 504")
+    args = parser.parse_args()
+
+    server = FakeTTSServer(
+        ("127.0.0.1", args.port),
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_429=args.rate_429,
+        rate_timeout=args.rate_timeout,
+        hang=args.hang,
+    )
+    print(f"Стенд TTS: {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
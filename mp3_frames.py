@@ -0,0 +1,313 @@
+"""
+Склейка MP3 без перекодирования и без запуска FFmpeg
+Части от одного движка TTS имеют одинаковые параметры кодирования, поэтому
+их можно объединить, просто записав аудиокадры подряд. Модуль разбирает
+заголовки кадров, отбрасывает служебные данные каждой части (теги ID3v2 и
+ID3v1, кадры Xing/Info/VBRI с длительностью отдельного файла) и пишет
+непрерывные участки кадров срезами memoryview - без копирования данных.
+В начало результата записывается кадр Info/Xing с общим числом кадров и
+размером, по которому плееры определяют длительность всего файла.
+"""
+
+import mmap
+import os
+import struct
+
+# Битрейты (кбит/с) по индексу: [MPEG-1, MPEG-2/2.5] x [Layer I, II, III]
+BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Частоты дискретизации по битам версии: 0 - MPEG-2.5, 2 - MPEG-2, 3 - MPEG-1
+SAMPLE_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+XING_FLAGS = 0x0001 | 0x0002  # В теге есть число кадров и размер потока
+XING_SIZE = 16  # "Xing" + флаги + кадры + байты
+
+_headers = {}  # Кэш разбора: 4 байта заголовка -> FrameHeader или None
+
+
+class FrameHeader:
+    """
+    Разобранный заголовок MP3-кадра
+    length - размер кадра в байтах, samples - отсчетов в кадре,
+    info_offset - смещение тега Xing/Info от начала кадра
+    """
+
+    __slots__ = ("length", "samples", "sample_rate", "bitrate", "info_offset")
+
+    def __init__(self, length, samples, sample_rate, bitrate, info_offset):
+        self.length = length
+        self.samples = samples
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+        self.info_offset = info_offset
+
+
+def parse_header(header: bytes):
+    """Разбор 4 байт заголовка кадра, None - не заголовок MPEG Audio"""
+    if header in _headers:
+        return _headers[header]
+    b0, b1, b2, b3 = header
+    result = None
+    version = (b1 >> 3) & 3
+    layer = 4 - ((b1 >> 1) & 3)  # Биты 11/10/01 - Layer I/II/III
+    bitrate_index = b2 >> 4
+    rate_index = (b2 >> 2) & 3
+    if (
+        b0 == 0xFF
+        and b1 & 0xE0 == 0xE0
+        and version != 1
+        and layer != 4
+        and bitrate_index not in (0, 15)  # Свободный битрейт не поддерживается
+        and rate_index != 3
+    ):
+        mpeg1 = version == 3
+        bitrate = BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index] * 1000
+        sample_rate = SAMPLE_RATES[version][rate_index]
+        padding = (b2 >> 1) & 1
+        if layer == 1:
+            samples = 384
+            length = (12 * bitrate // sample_rate + padding) * 4
+        else:
+            samples = 1152 if mpeg1 or layer == 2 else 576
+            length = samples // 8 * bitrate // sample_rate + padding
+        mono = b3 >> 6 == 3
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        crc = 0 if b1 & 1 else 2
+        result = FrameHeader(length, samples, sample_rate, bitrate, 4 + crc + side_info)
+    _headers[header] = result
+    return result
+
+
+def id3v2_size(data, pos: int) -> int:
+    """Размер тега ID3v2 в позиции pos (0 - тега нет)"""
+    if data[pos : pos + 3] != b"ID3" or len(data) < pos + 10:
+        return 0
+    size = 0
+    for byte in data[pos + 6 : pos + 10]:  # synchsafe: по 7 бит в байте
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[pos + 5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def is_info_frame(data, pos: int, header: FrameHeader) -> bool:
+    """Служебный кадр Xing/Info (LAME) или VBRI (Fraunhofer) без звука"""
+    tag = data[pos + header.info_offset : pos + header.info_offset + 4]
+    return tag in (b"Xing", b"Info") or data[pos + 36 : pos + 40] == b"VBRI"
+
+
+def _frame_follows(data, pos: int) -> bool:
+    """В позиции pos конец данных, тег или корректный заголовок кадра"""
+    if pos + 4 > len(data) or data[pos : pos + 3] in (b"ID3", b"TAG"):
+        return True
+    return parse_header(bytes(data[pos : pos + 4])) is not None
+
+
+def scan(data) -> tuple:
+    """
+    Поиск аудиокадров в содержимом MP3-файла
+    Возвращает (spans, first, bitrates): spans - непрерывные участки
+    аудиокадров (начало, конец, кадров, отсчетов), first - 4 байта заголовка
+    первого аудиокадра (None, если кадров нет), bitrates - встреченные
+    битрейты. Теги и служебные кадры в участки не входят, мусор между
+    кадрами пропускается.
+    """
+    spans = []
+    first = None
+    bitrates = set()
+    size = len(data)
+    pos = 0
+    start = frames = samples = 0
+    while pos + 4 <= size:
+        header = parse_header(bytes(data[pos : pos + 4]))
+        end = pos + header.length if header else 0
+        # Вне участка кадров (после тега или мусора) синхрослово может
+        # оказаться случайным: требуем корректное продолжение
+        if not header or end > size or (frames == 0 and not _frame_follows(data, end)):
+            if frames:
+                spans.append((start, pos, frames, samples))
+                frames = samples = 0
+            skip = id3v2_size(data, pos)
+            if skip:
+                pos += skip
+            elif data[pos : pos + 3] == b"TAG" and size - pos >= 128:
+                pos += 128  # ID3v1 (в конце каждой склеенной части)
+            else:
+                next_sync = data.find(b"\xff", pos + 1)
+                pos = next_sync if next_sync != -1 else size
+            continue
+        if is_info_frame(data, pos, header):
+            if frames:
+                spans.append((start, pos, frames, samples))
+                frames = samples = 0
+        else:
+            if first is None:
+                first = bytes(data[pos : pos + 4])
+            if not frames:
+                start = pos
+            frames += 1
+            samples += header.samples
+            bitrates.add(header.bitrate)
+        pos = end
+    if frames:
+        spans.append((start, pos, frames, samples))
+    return spans, first, bitrates
+
+
+def info_frame(header: bytes, frames: int, size: int, cbr: bool) -> bytes:
+    """
+    Кадр Info (CBR) или Xing (VBR) с общим числом кадров и размером потока
+    Параметры кадра берутся из заголовка первого аудиокадра; битрейт
+    повышается, если в кадр не помещается тег.
+    """
+    b0, b1, b2, b3 = header
+    b1 |= 1  # Без CRC
+    b2 &= ~0x02  # Без дополнительного байта
+    while True:
+        parsed = parse_header(bytes((b0, b1, b2, b3)))
+        if parsed.info_offset + XING_SIZE <= parsed.length or b2 >> 4 == 14:
+            break
+        b2 += 0x10  # Следующий индекс битрейта
+    frame = bytearray(parsed.length)
+    frame[:4] = bytes((b0, b1, b2, b3))
+    tag = b"Info" if cbr else b"Xing"
+    frame[parsed.info_offset : parsed.info_offset + XING_SIZE] = tag + struct.pack(
+        ">III", XING_FLAGS, frames, size
+    )
+    return bytes(frame)
+
+
+def _open_data(path: str):
+    """Содержимое файла: mmap (без чтения в память) или b"" для пустого"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def concat_files(
+    paths: list, out, max_seconds: float = 0, header: bool = True, ranges: list = None
+) -> dict:
+    """
+    Склейка MP3-файлов paths в поток out (двоичный файловый объект)
+    header=True: в начало пишется кадр Info/Xing с итоговой длительностью
+    (out должен поддерживать seek - тег заполняется в конце).
+    max_seconds > 0 обрезает результат по границе кадра.
+    ranges - [(пропустить, взять)] по файлам в отсчетах: из файла берутся
+    кадры после первых "пропустить" отсчетов, не более "взять" (0 - до
+    конца); границы должны совпадать с границами кадров.
+    Возвращает {"frames", "bytes", "seconds"} записанного аудио.
+    """
+    frames = written = samples = 0
+    limit = 0  # Предел в отсчетах (0 - без ограничения)
+    bitrates = set()
+    first = None
+    tag_at = None
+    for number, path in enumerate(paths):
+        skip, take = ranges[number] if ranges else (0, 0)
+        data = _open_data(path)
+        try:
+            spans, file_first, file_bitrates = scan(data)
+            spans = _select(data, spans, skip, take)
+            if file_first is None or not spans:
+                continue
+            if first is None:
+                first = file_first
+                if max_seconds:
+                    limit = max_seconds * parse_header(first).sample_rate
+                if header:
+                    # Заглушка под кадр Info, заполняется после подсчета
+                    tag_at = out.tell()
+                    written += out.write(info_frame(first, 0, 0, True))
+            bitrates |= file_bitrates
+            view = memoryview(data)
+            try:
+                for start, end, span_frames, span_samples in spans:
+                    if limit and samples + span_samples > limit:
+                        end, span_frames, span_samples = _cut_span(
+                            data, start, end, limit - samples
+                        )
+                    out.write(view[start:end])
+                    frames += span_frames
+                    samples += span_samples
+                    written += end - start
+                    if limit and samples >= limit:
+                        break
+            finally:
+                view.release()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        if limit and samples >= limit:
+            break
+
+    if tag_at is not None:
+        end_at = out.tell()
+        out.seek(tag_at)
+        out.write(info_frame(first, frames, written, len(bitrates) == 1))
+        out.seek(end_at)
+    sample_rate = parse_header(first).sample_rate if first else 0
+    return {
+        "frames": frames,
+        "bytes": written,
+        "seconds": samples / sample_rate if sample_rate else 0.0,
+    }
+
+
+def _select(data, spans: list, skip: int, take: int) -> list:
+    """Участки кадров после первых skip отсчетов, не более take (0 - все)"""
+    if not skip and not take:
+        return spans
+    selected = []
+    for start, end, frames, samples in spans:
+        if skip >= samples:
+            skip -= samples
+            continue
+        if skip:
+            cut, cut_frames, cut_samples = _cut_span(data, start, end, skip)
+            start, frames, samples = cut, frames - cut_frames, samples - cut_samples
+            skip = 0
+        if take:
+            if samples >= take:
+                end, frames, samples = _cut_span(data, start, end, take)
+                selected.append((start, end, frames, samples))
+                break
+            take -= samples
+        selected.append((start, end, frames, samples))
+    return selected
+
+
+def _cut_span(data, start: int, end: int, limit: float) -> tuple:
+    """Конец участка, число кадров и отсчетов, укладывающихся в limit отсчетов"""
+    pos = start
+    frames = samples = 0
+    while pos < end:
+        header = parse_header(bytes(data[pos : pos + 4]))
+        if samples + header.samples > limit:
+            break
+        samples += header.samples
+        frames += 1
+        pos += header.length
+    return pos, frames, samples
+
+
+def data_duration(data) -> float:
+    """Длительность MP3 в памяти по его аудиокадрам (сек)"""
+    spans, first, _ = scan(data)
+    if first is None:
+        return 0.0
+    return sum(span[3] for span in spans) / parse_header(first).sample_rate
+
+
+def duration(path: str) -> float:
+    """Длительность MP3-файла по его аудиокадрам (сек)"""
+    data = _open_data(path)
+    try:
+        return data_duration(data)
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
@@ -0,0 +1,212 @@
+"""
+Склейка Ogg Opus без перекодирования
+Модуль читает пакеты Opus из файлов Ogg и записывает их в один логический
+поток с новой разбивкой на страницы: номера страниц, позиции (granule) и
+контрольные суммы пересчитываются. Из каждого файла можно взять участок
+пакетов, отбросив начало и конец, - так сегменты, закодированные с
+перекрытием, стыкуются по границе пакета без повторной задержки кодера
+(pre-skip) на каждом стыке. Заголовки OpusHead и OpusTags берутся из
+первого файла; позиция последней страницы задает точную длину потока.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+
+OPUS_RATE = 48000  # Позиции Ogg Opus всегда в отсчетах 48 кГц
+MAX_PAGE_BODY = 4096  # Данных на страницу при записи (как у libogg)
+
+# Длительность кадра (в отсчетах 48 кГц) по номеру конфигурации TOC (RFC 6716)
+_FRAME_SAMPLES = (
+    [480, 960, 1920, 2880] * 3  # SILK: 10, 20, 40, 60 мс
+    + [480, 960] * 2  # Hybrid: 10, 20 мс
+    + [120, 240, 480, 960] * 4  # CELT: 2.5, 5, 10, 20 мс
+)
+
+
+# Байт с обратным порядком бит (для CRC Ogg через zlib.crc32)
+_REVERSE = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+
+
+def page_crc(page: bytes) -> int:
+    """
+    Контрольная сумма страницы Ogg (полином 0x04C11DB7, без отражения)
+    Считается через zlib.crc32 по байтам с обратным порядком бит: так
+    вычисление идет на C, а не побайтно в Python
+    """
+    raw = zlib.crc32(page.translate(_REVERSE), 0xFFFFFFFF) ^ 0xFFFFFFFF
+    return int(f"{raw:032b}"[::-1], 2)
+
+
+def packet_samples(packet: bytes) -> int:
+    """Длительность пакета Opus в отсчетах 48 кГц (по байту TOC)"""
+    if not packet:
+        return 0
+    toc = packet[0]
+    code = toc & 3
+    if code == 0:
+        frames = 1
+    elif code in (1, 2):
+        frames = 2
+    else:
+        frames = packet[1] & 0x3F if len(packet) > 1 else 0
+    return _FRAME_SAMPLES[toc >> 3] * frames
+
+
+def pre_skip(head: bytes) -> int:
+    """Задержка кодера из заголовка OpusHead (отсчетов 48 кГц)"""
+    if head[:8] != b"OpusHead":
+        raise ValueError("Поток не является Ogg Opus")
+    return struct.unpack_from("<H", head, 10)[0]
+
+
+def iter_packets(data):
+    """Пакеты первого логического потока Ogg в порядке следования"""
+    pos = 0
+    serial = None
+    parts = []
+    while pos + 27 <= len(data):
+        if data[pos : pos + 4] != b"OggS":
+            raise ValueError(f"Нет страницы Ogg в позиции {pos}")
+        page_serial = struct.unpack_from("<I", data, pos + 14)[0]
+        count = data[pos + 26]
+        lacing = bytes(data[pos + 27 : pos + 27 + count])
+        body = pos + 27 + count
+        if serial is None:
+            serial = page_serial
+        if page_serial == serial:
+            for size in lacing:
+                parts.append(bytes(data[body : body + size]))
+                body += size
+                if size < 255:
+                    yield b"".join(parts)
+                    parts = []
+        pos = pos + 27 + count + sum(lacing)
+
+
+class OggWriter:
+    """
+    Запись пакетов одного логического потока Ogg
+    Пакеты копятся и выводятся страницами до MAX_PAGE_BODY байт; пакет,
+    не поместившийся в 255 сегментов страницы, продолжается на следующей.
+    Последние пакеты выводятся в close() со страницей конца потока (EOS).
+    """
+
+    def __init__(self, out, serial: int):
+        self.out = out
+        self.serial = serial
+        self.sequence = 0
+        self.pending = []  # (пакет, позиция granule после него)
+        self.size = 0
+
+    def write(self, packet: bytes, granule: int, flush: bool = False):
+        if self.pending and self.size + len(packet) > MAX_PAGE_BODY:
+            self._flush()
+        self.pending.append((packet, granule))
+        self.size += len(packet)
+        if flush:
+            self._flush()
+
+    def close(self, granule: int = None):
+        """Вывод оставшихся пакетов; granule - позиция конца потока (обрезка)"""
+        if granule is not None and self.pending:
+            packet, _ = self.pending[-1]
+            self.pending[-1] = (packet, granule)
+        self._flush(eos=True)
+
+    def _flush(self, eos: bool = False):
+        segments = []  # (размер, granule, если сегментом заканчивается пакет)
+        for packet, granule in self.pending:
+            sizes = [255] * (len(packet) // 255) + [len(packet) % 255]
+            segments.extend((size, None) for size in sizes[:-1])
+            segments.append((sizes[-1], granule))
+        body = b"".join(packet for packet, _ in self.pending)
+        self.pending = []
+        self.size = 0
+        pos = 0
+        continued = False
+        for start in range(0, len(segments), 255):
+            page = segments[start : start + 255]
+            granule = -1  # На странице не заканчивается ни один пакет
+            for _, packet_granule in page:
+                if packet_granule is not None:
+                    granule = packet_granule
+            length = sum(size for size, _ in page)
+            flags = (1 if continued else 0) | (2 if self.sequence == 0 else 0)
+            if eos and start + 255 >= len(segments):
+                flags |= 4
+            self._page(flags, granule, bytes(size for size, _ in page), body[pos : pos + length])
+            pos += length
+            continued = page[-1][1] is None
+
+    def _page(self, flags: int, granule: int, lacing: bytes, body: bytes):
+        header = struct.pack(
+            "<4sBBqIIIB", b"OggS", 0, flags, granule, self.serial, self.sequence, 0, len(lacing)
+        )
+        page = bytearray(header + lacing + body)
+        struct.pack_into("<I", page, 22, page_crc(bytes(page)))
+        self.out.write(page)
+        self.sequence += 1
+
+
+def _open_data(path: str):
+    """Содержимое файла: mmap (без чтения в память) или b"" для пустого"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def concat_files(parts: list, out, length: int = 0) -> dict:
+    """
+    Склейка участков файлов Ogg Opus в поток out
+    parts - [(путь, пропустить, взять)]: из файла берутся пакеты после
+    первых "пропустить" отсчетов, не более "взять" отсчетов (0 - до конца);
+    границы участков должны совпадать с границами пакетов.
+    length > 0 - длина результата в отсчетах 48 кГц (без pre-skip):
+    лишние пакеты не пишутся, а конец последнего отбрасывается плеером
+    по позиции последней страницы.
+    Возвращает {"packets", "seconds"} записанного аудио.
+    """
+    writer = None
+    skip_head = 0
+    granule = 0
+    packets = 0
+    done = False
+    for path, skip, take in parts:
+        data = _open_data(path)
+        try:
+            stream = iter_packets(data)
+            head = next(stream, b"")
+            tags = next(stream, b"")
+            if writer is None:
+                skip_head = pre_skip(head)
+                writer = OggWriter(out, serial=1)
+                writer.write(head, 0, flush=True)
+                writer.write(tags, 0, flush=True)
+            position = 0  # Отсчетов файла от начала его пакетов
+            for packet in stream:
+                samples = packet_samples(packet)
+                position += samples
+                if position <= skip:
+                    continue
+                if take and position > skip + take:
+                    break
+                granule += samples
+                packets += 1
+                writer.write(packet, granule)
+                if length and granule - skip_head >= length:
+                    done = True
+                    break
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+        if done:
+            break
+    if writer is None:
+        raise ValueError("Нет файлов Ogg Opus для склейки")
+    if length and granule - skip_head > length:
+        granule = skip_head + length
+    writer.close(granule)
+    return {"packets": packets, "seconds": (granule - skip_head) / OPUS_RATE}
@@ -0,0 +1,280 @@
+"""
+Общие части скриптов генерации речи
+Разбиение текста на чанки (split_text, iter_chunks) и список частей для
+concat-демультиплексора FFmpeg. Модуль не зависит от конфигурации скриптов:
+способ разбиения передается параметром chunking, а функция логирования -
+параметром log с сигнатурой log(message, level, *args), где args
+подставляются в message только для выводимых уровней. Без log сообщения
+разбиения не выводятся.
+"""
+
+import os
+import re
+import zlib
+from collections import deque
+
+SEPARATORS = ["\n\n", "\n", ". ", "! ", "? ", "; ", ", ", " "]
+
+# Конец предложения или строки вместе с пробелами после него
+UNIT_END = re.compile(r"[.!?…]+[\"'»”)\]]*\s+|\n\s*")
+
+
+def _no_log(message: str, level: str = "INFO", *args):
+    """Логирование по умолчанию: сообщения не выводятся"""
+
+
+def split_text(
+    text: str, chunk_size: int, spans: list = None, chunking: str = "greedy", log=None
+) -> list:
+    """
+    Умное разбиение текста на части с сохранением целостности структуры
+    Алгоритм:
+    1. Ищет последний подходящий разделитель в пределах chunk_size
+    2. Если разделители не найдены - делает принудительный разрыв
+    3. Объединяет слишком маленькие чанки
+    spans - список, в который для каждого чанка добавляется (начало, конец) -
+    его положение в text (в символах)
+    chunking - greedy (подряд по chunk_size) или anchored (см. _anchored_chunks)
+    log - функция логирования (см. описание модуля)
+    """
+    log = log or _no_log
+    log(f"Начало разбиения текста (общий размер: {len(text)} символов)", "DEBUG")
+    if chunking == "anchored":
+        return list(_anchored_chunks([text], chunk_size, spans, log))
+    cut_spans = None if spans is None else deque()
+    chunks = _cut_chunks([text], chunk_size, strip=False, spans=cut_spans, log=log)
+    return list(_merge_chunks(chunks, chunk_size, cut_spans, spans, log))
+
+
+def iter_chunks(
+    blocks, chunk_size: int, spans: list = None, chunking: str = "greedy", log=None
+):
+    """
+    Ленивое разбиение потока текста на чанки
+    Принимает итерируемый набор блоков текста (например, блоки файла)
+    и выдает те же чанки, что и split_text(text.strip(), chunk_size, chunking=...),
+    храня в памяти только текущее окно, а не весь текст.
+    spans - как в split_text, положение в исходном потоке (с начальными
+    пробелами); пополняется по мере выдачи чанков.
+    """
+    log = log or _no_log
+    if chunking == "anchored":
+        return _anchored_chunks(blocks, chunk_size, spans, log)
+    cut_spans = None if spans is None else deque()
+    chunks = _cut_chunks(blocks, chunk_size, spans=cut_spans, log=log)
+    return _merge_chunks(chunks, chunk_size, cut_spans, spans, log)
+
+
+def find_break(text: str, start: int, end: int) -> int:
+    """
+    Самая правая позиция начала любого из SEPARATORS в окне [start, end]
+    Эквивалентна максимуму из rfind по каждому разделителю, но сводится
+    к двум поискам: "\n\n" начинается там же, где "\n", а за ". ", "! " и
+    т.п. в позиции p < end следует пробел p + 1, который правее. Поэтому
+    знак препинания важен только ровно на границе окна. Возвращает -1,
+    если разделителей нет.
+    """
+    if text[end : end + 1] in (".", "!", "?", ";", ",") and text[end + 1 : end + 2] == " ":
+        return end
+    return max(text.rfind(" ", start, end + 1), text.rfind("\n", start, end + 1))
+
+
+def _cut_chunks(blocks, chunk_size: int, strip: bool = True, spans=None, log=_no_log):
+    """
+    Нарезка потока текста по разделителям (шаги 1-2 алгоритма split_text)
+    Решение о разрыве принимается, когда в буфере есть chunk_size символов
+    после начала чанка плюс запас на самый длинный разделитель.
+    strip=True отбрасывает пробелы в начале и в конце всего потока.
+    spans - очередь, в которую перед выдачей чанка добавляется его
+    положение в потоке (начало, конец)
+    """
+    max_sep = max(len(sep) for sep in SEPARATORS)
+    blocks = iter(blocks)
+    buf = ""
+    base = 0  # Позиция buf[0] в потоке
+    start = 0
+    content_end = 0  # Позиция после последнего непробельного символа буфера
+    leading = strip
+    eof = False
+    count = 0
+
+    while True:
+        # Дочитываем данные, пока их не хватает для выбора точки разрыва
+        while not eof and content_end - start < chunk_size + max_sep:
+            block = next(blocks, None)
+            if block is None:
+                eof = True
+                if strip:
+                    buf = buf[:content_end]
+                break
+            if leading:
+                stripped = block.lstrip()
+                base += len(block) - len(stripped)
+                block = stripped
+                leading = not block
+            if not strip:
+                content_end = len(buf) + len(block)
+            elif block.strip():
+                content_end = len(buf) + len(block.rstrip())
+            buf += block
+
+        text_length = len(buf)
+        if start >= text_length:
+            break
+
+        end = min(start + chunk_size, text_length)
+
+        # Поиск оптимальной точки разрыва
+        if end < text_length:
+            best_pos = find_break(buf, start, end)
+            if best_pos != -1 and (best_pos - start) > chunk_size * 0.5:
+                end = best_pos + 1  # Включаем разделитель в текущий чанк
+
+        raw = buf[start:end]
+        chunk = raw.strip()
+        if chunk:
+            if spans is not None:
+                first = base + start + len(raw) - len(raw.lstrip())
+                spans.append((first, first + len(chunk)))
+            count += 1
+            log("Создан чанк [%d] размером %d символов", "DEBUG", count, len(chunk))
+            yield chunk
+
+        start = end
+
+        # Сжатие буфера: отбрасываем обработанную часть (амортизированно O(n))
+        if start > len(buf) // 2:
+            buf = buf[start:]
+            content_end -= start
+            base += start
+            start = 0
+
+
+def _merge_chunks(chunks, chunk_size: int, cut_spans=None, spans: list = None, log=_no_log):
+    """
+    Оптимизация: объединение маленьких соседних чанков (шаг 3 split_text)
+    Части накапливаются в списке и склеиваются один раз при выдаче
+    cut_spans - положения входных чанков (пополняет _cut_chunks), в spans
+    добавляется положение каждого выданного: от начала первой части до
+    конца последней
+    """
+    parts = []
+    length = 0
+    count = merged = 0
+    span = None
+    for chunk in chunks:
+        count += 1
+        part_span = cut_spans.popleft() if spans is not None else None
+        if not parts:
+            parts.append(chunk)
+            length = len(chunk)
+            span = part_span
+        elif length + len(chunk) <= chunk_size * 1.2:
+            parts.append(chunk)
+            length += 1 + len(chunk)
+            if span:
+                span = (span[0], part_span[1])
+            log("Объединение чанков [%d]", "DEBUG", merged + 1)
+        else:
+            merged += 1
+            if spans is not None:
+                spans.append(span)
+            yield " ".join(parts)
+            parts = [chunk]
+            length = len(chunk)
+            span = part_span
+    if parts:
+        merged += 1
+        if spans is not None:
+            spans.append(span)
+        yield " ".join(parts)
+    if count > 1:
+        log(f"Оптимизация чанков: {count} → {merged}", "DEBUG")
+
+
+def _iter_units(blocks):
+    """
+    Единицы текста для разбиения anchored: предложения и строки
+    Выдает (позиция, текст) - текст единицы с пробелами после нее;
+    единицы идут подряд и вместе составляют весь поток
+    """
+    buf = ""
+    base = 0  # Позиция buf[0] в потоке
+    for block in blocks:
+        buf += block
+        pos = 0
+        for match in UNIT_END.finditer(buf):
+            if match.end() >= len(buf):
+                break  # Пробелы или знаки могут продолжиться в следующем блоке
+            yield base + pos, buf[pos : match.end()]
+            pos = match.end()
+        buf = buf[pos:]
+        base += pos
+    if buf:
+        yield base, buf
+
+
+def _anchored_chunks(blocks, chunk_size: int, spans: list = None, log=_no_log):
+    """
+    Разбиение с границами, привязанными к содержимому (CHUNKING=anchored)
+    Текст делится на предложения и строки (длинные - как в split_text),
+    которые подряд собираются в чанки. Чанк завершается после единицы,
+    CRC32 которой меньше ее доли от chunk_size/2 (в среднем граница через
+    каждые chunk_size/2 символов), но не короче chunk_size/4; единица, с
+    которой чанк превысил бы chunk_size, начинает новый. Решение зависит
+    только от текста единицы, поэтому после правки границы совпадают с
+    прежними начиная с первой такой единицы за измененным местом, и
+    хэши остальных чанков не меняются.
+    Чанк - непрерывный участок текста; spans - как в split_text.
+    """
+    target = chunk_size / 2
+    parts = []
+    start = length = 0
+    count = 0
+
+    def flush() -> str:
+        nonlocal count
+        chunk = "".join(parts).strip()
+        parts.clear()
+        if spans is not None:
+            spans.append((start, start + len(chunk)))
+        count += 1
+        log("Создан чанк [%d] размером %d символов", "DEBUG", count, len(chunk))
+        return chunk
+
+    for pos, raw in _iter_units(blocks):
+        pieces = [(pos, raw)]
+        if len(raw) > chunk_size:
+            # Предложение длиннее чанка режется как в split_text
+            cut = deque()
+            list(_cut_chunks([raw], chunk_size, strip=False, spans=cut))
+            starts = [piece_start for piece_start, _ in cut]
+            ends = starts[1:] + [len(raw)]
+            pieces = [(pos + a, raw[a:b]) for a, b in zip(starts, ends)]
+        for pos, raw in pieces:
+            content = raw.strip()
+            if not content:
+                continue  # Пробелы в начале потока
+            # Длина чанка с этой единицей - весь участок текста от его
+            # начала, включая пробелы и переводы строк между единицами
+            if parts and pos + len(raw.rstrip()) - start > chunk_size:
+                yield flush()
+            if not parts:
+                start = pos + len(raw) - len(raw.lstrip())
+            parts.append(raw)
+            length = pos + len(raw.rstrip()) - start
+            anchor = zlib.crc32(content.encode("utf-8")) < len(content) / target * 2**32
+            if anchor and length >= chunk_size // 4:
+                yield flush()
+    if parts:
+        yield flush()
+
+
+def write_concat_list(files: list, path: str) -> str:
+    """Запись списка файлов для concat-демультиплексора FFmpeg в path"""
+    with open(path, "w", encoding="utf-8") as f:
+        for file in files:
+            # Одинарные кавычки в пути экранируются по правилам FFmpeg
+            escaped = os.path.abspath(file).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return path
@@ -0,0 +1,315 @@
+"""
+Движки синтеза речи с единым интерфейсом
+Общий API: synthesize(chunks) -> список аудиосегментов (bytes) в формате
+audio_format движка. Для планирования на уровне сетевых запросов движок
+разбивает текст на единицы запроса (plan) и выполняет их по одной (fetch);
+аудио текста - склейка результатов fetch в порядке plan. Экземпляры долгоживущие: get_engine() создает движок
+один раз на процесс и переиспользует его во всех задачах, поэтому
+инициализация (например, pyttsx3.init() и перебор голосов) не повторяется.
+"""
+
+import base64
+import os
+import re
+import tempfile
+import threading
+import time
+import urllib.request
+
+
+class TTSEngine:
+    """
+    Базовый класс движка синтеза речи
+    Атрибуты класса:
+        name - идентификатор движка (участвует в ключе кэша)
+        audio_format - формат (расширение) выдаваемого аудио
+        rate_limited - запросы к движку нужно ограничивать по частоте
+    """
+
+    name = "base"
+    audio_format = "mp3"
+    rate_limited = False
+
+    def options(self) -> dict:
+        """Параметры, влияющие на звучание (участвуют в ключе кэша)"""
+        return {}
+
+    def synthesize(self, chunks: list) -> list:
+        """Синтез набора текстов, возвращает аудио для каждого в том же порядке"""
+        raise NotImplementedError
+
+    def plan(self, text: str) -> list:
+        """Разбиение текста на независимые единицы запроса к движку"""
+        return [text]
+
+    def fetch(self, unit) -> bytes:
+        """Выполнение одной единицы запроса из plan()"""
+        (audio,) = self.synthesize([unit])
+        return audio
+
+    def unit_key(self, unit) -> str:
+        """
+        Ключ единицы запроса: единицы с равными ключами дают одинаковое
+        аудио, и его можно синтезировать один раз (None - не сравнивать)
+        """
+        return unit if isinstance(unit, str) else None
+
+    def synthesize_to_file(self, text: str, path: str):
+        """Синтез одного текста с записью результата в файл"""
+        (audio,) = self.synthesize([text])
+        with open(path, "wb") as f:
+            f.write(audio)
+
+    def connection_stats(self) -> dict:
+        """Счетчики сетевых соединений движка (пусто - движок не сетевой)"""
+        return {}
+
+    def close(self):
+        """Освобождение ресурсов движка"""
+
+
+class GTTSEngine(TTSEngine):
+    """
+    Google Text-to-Speech через неофициальный API Google Translate
+    gTTS делит текст на токены по ~100 символов и отправляет по HTTP-запросу
+    на каждый. plan() возвращает эти подготовленные запросы, а fetch()
+    отправляет один из них с таймаутом и декодирует аудио - так повтор
+    и параллелизм работают на уровне отдельного запроса, а не всего текста.
+    Все запросы движка идут через одну сессию requests с пулом keep-alive
+    соединений (pool_hosts пулов по хостам, до pool_size соединений на
+    хост), поэтому TCP+TLS рукопожатие не повторяется на каждый запрос.
+    """
+
+    name = "gtts"
+    audio_format = "mp3"
+    rate_limited = True
+
+    def __init__(
+        self,
+        language: str = "ru",
+        slow: bool = False,
+        tld: str = "com",
+        timeout: float = 30,
+        base_url: str = "",
+        pool_size: int = 10,
+        pool_hosts: int = 4,
+    ):
+        """base_url - альтернативный адрес API (зеркало, локальный стенд)"""
+        from gtts import gTTS  # Импорт здесь: движок нужен не всем скриптам
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if base_url:
+            gTTS = _redirected_gtts(gTTS, base_url)
+        self.gTTS = gTTS
+        # При verify=False urllib3 предупреждает о каждом запросе
+        requests.packages.urllib3.disable_warnings(
+            requests.packages.urllib3.exceptions.InsecureRequestWarning
+        )
+        self.language = language
+        self.slow = slow
+        self.tld = tld
+        self.timeout = timeout
+        self.base_url = base_url
+
+        # pool_block: при занятом пуле поток ждет соединение, а не открывает
+        # лишнее, которое urllib3 затем закроет
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_hosts, pool_maxsize=pool_size, pool_block=True
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+
+    def options(self) -> dict:
+        options = {"slow": self.slow, "tld": self.tld}
+        if self.base_url:
+            # Аудио зеркала или стенда не должно подменять ответы Google в кэше
+            options["base_url"] = self.base_url
+        return options
+
+    def _request(self, text: str):
+        return self.gTTS(
+            text=text,
+            lang=self.language,
+            tld=self.tld,
+            lang_check=False,  # Отключаем проверку для нестандартных текстов
+            slow=self.slow,
+        )
+
+    def synthesize(self, chunks: list) -> list:
+        return [b"".join(map(self.fetch, self.plan(text))) for text in chunks]
+
+    def plan(self, text: str) -> list:
+        tts = self._request(text)
+        return [(tts, request) for request in tts._prepare_requests()]
+
+    def fetch(self, unit) -> bytes:
+        """Отправка одного запроса gTTS; ошибки - gTTSError, как у самого gTTS"""
+        from gtts.tts import gTTSError
+        import requests
+
+        tts, request = unit
+        try:
+            # verify=False - как в gTTS (прокси с подменой сертификатов)
+            response = self.session.send(
+                request,
+                proxies=urllib.request.getproxies(),
+                verify=False,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            raise gTTSError(tts=tts, response=response)
+        except requests.exceptions.RequestException as e:
+            raise gTTSError(f"Failed to connect: {e}")
+
+        match = GTTS_AUDIO_RE.search(response.text)
+        if not match:
+            raise gTTSError(tts=tts, response=response)
+        return base64.b64decode(match.group(1))
+
+    def unit_key(self, unit) -> str:
+        # Тело запроса: текст токена, язык и скорость речи
+        return unit[1].body
+
+    def connection_stats(self) -> dict:
+        """
+        Счетчики пула соединений: HTTP-запросов, открытых соединений и
+        запросов, выполненных по уже открытому (keep-alive) соединению
+        """
+        managers = [self.adapter.poolmanager, *self.adapter.proxy_manager.values()]
+        # Пулы, вытесненные из pool_hosts, в подсчет уже не входят
+        pools = [
+            manager.pools.get(key) for manager in managers for key in manager.pools.keys()
+        ]
+        sent = sum(pool.num_requests for pool in pools if pool)
+        connections = sum(pool.num_connections for pool in pools if pool)
+        return {"requests": sent, "connections": connections, "reused": sent - connections}
+
+    def close(self):
+        self.session.close()
+
+
+# Аудио (base64) в ответе batchexecute - то же выражение, что в gTTS.stream()
+GTTS_AUDIO_RE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+
+def _redirected_gtts(gtts_class, base_url: str):
+    """Подкласс gTTS, отправляющий запросы на base_url вместо translate.google"""
+    from urllib.parse import urlsplit
+
+    class RedirectedGTTS(gtts_class):
+        def _prepare_requests(self):
+            prepared = super()._prepare_requests()
+            for request in prepared:
+                request.url = base_url.rstrip("/") + urlsplit(request.url).path
+            return prepared
+
+    return RedirectedGTTS
+
+
+class Pyttsx3Engine(TTSEngine):
+    """
+    Офлайн-синтез через pyttsx3 (системные голоса)
+    Движок pyttsx3 инициализируется один раз; пакетный синтез ставит все
+    тексты в очередь и выполняет их одним вызовом runAndWait().
+    Экземпляр pyttsx3 не потокобезопасен, вызовы сериализуются блокировкой.
+    """
+
+    name = "pyttsx3"
+    audio_format = "wav"
+
+    def __init__(self, voice: str = "Russian", rate: int = 150, volume: float = 1.0):
+        import pyttsx3
+
+        self.engine = pyttsx3.init()
+        self.voices = self.engine.getProperty("voices")
+        self.rate = rate
+        self.volume = volume
+        self.engine.setProperty("rate", rate)
+        self.engine.setProperty("volume", volume)
+        try:
+            self.engine.setProperty("voice", voice)
+            self.voice = voice
+            self.voice_error = None
+        except Exception as e:
+            self.voice = None  # Используется голос по умолчанию
+            self.voice_error = e
+        self.lock = threading.Lock()
+
+    def options(self) -> dict:
+        return {"voice": self.voice, "rate": self.rate, "volume": self.volume}
+
+    def synthesize(self, chunks: list) -> list:
+        with self.lock, tempfile.TemporaryDirectory(prefix="pyttsx3_") as tmp_dir:
+            paths = [os.path.join(tmp_dir, f"{idx:06d}.wav") for idx in range(len(chunks))]
+            for text, path in zip(chunks, paths):
+                self.engine.save_to_file(text, path)
+            self.engine.runAndWait()  # Ожидание завершения всей очереди
+            segments = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    segments.append(f.read())
+            return segments
+
+    def synthesize_to_file(self, text: str, path: str):
+        with self.lock:
+            self.engine.save_to_file(text, path)
+            self.engine.runAndWait()
+
+    def close(self):
+        self.engine.stop()
+
+
+class FakeEngine(TTSEngine):
+    """
+    Детерминированный офлайн-движок для бенчмарков и отладки
+    Возвращает корректный MP3 (тишина, MPEG-2 Layer III, 24 кГц, моно,
+    32 кбит/с - как у gTTS) длительностью пропорционально длине текста.
+    Параметр latency имитирует время ответа сервиса (сек на текст).
+    """
+
+    name = "fake"
+    audio_format = "mp3"
+    # Заголовок кадра: MPEG-2, Layer III, без CRC, 32 кбит/с, 24 кГц, моно
+    FRAME = bytes([0xFF, 0xF3, 0x44, 0xC4]) + bytes(92)  # 96 байт = 24 мс
+    FRAMES_PER_CHAR = 3  # ~14 символов в секунду, как у живой речи
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def options(self) -> dict:
+        return {}
+
+    def synthesize(self, chunks: list) -> list:
+        segments = []
+        for text in chunks:
+            if self.latency:
+                time.sleep(self.latency)
+            segments.append(self.FRAME * max(1, len(text) * self.FRAMES_PER_CHAR))
+        return segments
+
+
+ENGINES = {
+    GTTSEngine.name: GTTSEngine,
+    Pyttsx3Engine.name: Pyttsx3Engine,
+    FakeEngine.name: FakeEngine,
+}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_engine(name: str, **options) -> TTSEngine:
+    """
+    Долгоживущий экземпляр движка для текущего процесса
+    Повторные вызовы с теми же параметрами возвращают тот же объект
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Неизвестный движок TTS: {name} (доступны: {', '.join(ENGINES)})")
+    key = (name, tuple(sorted(options.items())))
+    with _instances_lock:
+        if key not in _instances:
+            _instances[key] = ENGINES[name](**options)
+        return _instances[key]